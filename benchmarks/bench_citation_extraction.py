@@ -0,0 +1,117 @@
+# benchmarks/bench_citation_extraction.py
+"""
+Бенчмарк extract_cited_sources
+Сравнивает прежний разбор (13 отдельных finditer + поиск каждой платформы через lower()/find())
+с однопроходным CitationMatcher на синтетическом корпусе ответов LLM и проверяет совпадение результатов.
+
+Запуск: python benchmarks/bench_citation_extraction.py [--responses N]
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import argparse
+import random
+import re
+import time
+from typing import Dict, List
+from urllib.parse import urlparse
+
+from modules.source_finder import KNOWN_PLATFORMS, extract_cited_sources
+
+LEGACY_PATTERNS = [
+    (r'https?://(?:www\.)?([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})(?:/[^\s]*)?', 'url'),
+    (r'(?:on|in|according to|based on|from) (?:website|platform|resource) ([A-Za-z0-9\s.-]+)', 'site'),
+    (r'(?:on|at) ([A-Za-z0-9\s.-]+\.(?:com|org|net|io))', 'site'),
+    (r'in (?:article|research|study|review) "([^"]+)"', 'article'),
+    (r'according to the ([A-Za-z0-9\s.-]+) (?:article|study)', 'article'),
+    (r'in the ([A-Za-z0-9\s.-]+) blog', 'blog'),
+    (r'on ([A-Za-z0-9\s.-]+)\'s blog', 'blog'),
+    (r'on (?:forum|platform|community) ([A-Za-z0-9\s.-]+)', 'forum'),
+    (r'at ([A-Za-z0-9\s.-]+) forums', 'forum'),
+    (r'GitHub(?: repository)? ([a-zA-Z0-9_-]+/[a-zA-Z0-9_-]+)', 'github'),
+    (r'on GitHub: ([a-zA-Z0-9_-]+/[a-zA-Z0-9_-]+)', 'github'),
+    (r'in the ([A-Za-z0-9\s.-]+) documentation', 'docs'),
+    (r'according to ([A-Za-z0-9\s.-]+) docs', 'docs'),
+]
+
+def legacy_extract(text: str) -> List[Dict]:
+    """Прежняя реализация extract_cited_sources"""
+    sources = []
+    for pattern, source_type in LEGACY_PATTERNS:
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            source_name = match.group(1).strip()
+            if source_type == 'url':
+                parsed = urlparse(f"http://{source_name}" if '://' not in source_name else source_name)
+                source_name = parsed.netloc or parsed.path.split('/')[0]
+            context = text[max(0, match.start() - 100):min(len(text), match.end() + 100)]
+            quote = text[match.end():min(len(text), match.end() + 300)].split('.')[0] + '.'
+            sources.append({'source_name': source_name, 'source_type': source_type, 'context': context,
+                            'quote': quote.strip(), 'full_match': match.group(0)})
+
+    text_lower = text.lower()
+    for url_keyword, platform_name in KNOWN_PLATFORMS.items():
+        if url_keyword in text_lower:
+            idx = text_lower.find(url_keyword)
+            context = text[max(0, idx - 100):min(len(text), idx + len(url_keyword) + 100)]
+            sources.append({'source_name': platform_name, 'source_type': 'known_platform', 'context': context,
+                            'quote': context[:150] + '...', 'full_match': url_keyword})
+    return sources
+
+FILLER = ("workflow automation platform integration pricing support teams startups webhook trigger "
+          "api connectors reliable scalable enterprise small business in on at from the").split()
+CITATIONS = [
+    "https://www.{d}/guide/{w}", "on website {D}", "according to platform {D} docs", "on {d}",
+    "at {d}", 'in article "{W} in practice"', "according to the {D} study", "in the {D} blog",
+    "on {D}'s blog", "on community {D}", "at {D} forums", "GitHub repository {w}/{w}",
+    "on GitHub: {w}/{w}", "in the {D} documentation", "according to {D} docs", "{p}", "see {p} for details",
+]
+DOMAINS = ["zapier.com", "n8n.io", "make.com", "example.org", "automation.net"]
+
+def make_corpus(size: int, seed: int = 42) -> List[str]:
+    """Ответы ~2500 символов, в среднем 5-6 ссылок на источники"""
+    rng = random.Random(seed)
+    platforms = list(KNOWN_PLATFORMS)
+    corpus = []
+    for _ in range(size):
+        parts = []
+        while sum(len(part) + 1 for part in parts) < 2500:
+            if rng.random() < 0.02:
+                domain = rng.choice(DOMAINS)
+                parts.append(rng.choice(CITATIONS).format(
+                    d=domain, D=domain.split('.')[0].title(), w=rng.choice(FILLER),
+                    W=rng.choice(FILLER).title(), p=rng.choice(platforms)
+                ) + '.')
+            else:
+                parts.append(rng.choice(FILLER))
+        corpus.append(' '.join(parts))
+    return corpus
+
+def measure(func, corpus: List[str]) -> float:
+    started = time.perf_counter()
+    for text in corpus:
+        func(text)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк extract_cited_sources")
+    parser.add_argument('--responses', type=int, default=2000, help="размер корпуса")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.responses)
+    mismatches = sum(1 for text in corpus if legacy_extract(text) != extract_cited_sources(text))
+    total_mb = sum(len(text) for text in corpus) / 1e6
+
+    legacy_time = measure(legacy_extract, corpus)
+    matcher_time = measure(extract_cited_sources, corpus)
+
+    print(f"Responses: {len(corpus)}, {total_mb:.1f} MB, results differing from legacy: {mismatches}")
+    print(f"{'Engine':>8} {'Resp/s':>9} {'MB/s':>7}")
+    print(f"{'legacy':>8} {len(corpus) / legacy_time:>9.0f} {total_mb / legacy_time:>7.2f}")
+    print(f"{'matcher':>8} {len(corpus) / matcher_time:>9.0f} {total_mb / matcher_time:>7.2f}")
+    print(f"Speedup: {legacy_time / matcher_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
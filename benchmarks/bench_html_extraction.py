@@ -0,0 +1,140 @@
+# benchmarks/bench_html_extraction.py
+"""
+Бенчмарк извлечения текста из HTML
+Сравнивает прежний путь scrape_website (BeautifulSoup + html.parser, decompose, regex на каждый продукт)
+с бэкендами html_extract и однопроходным ProductMatcher: страниц в секунду и пиковая память.
+
+Запуск: python benchmarks/bench_html_extraction.py [--corpus DIR] [--pages N]
+Без --corpus используется синтетический корпус; DIR - каталог с сохраненными *.html страницами.
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import argparse
+import glob
+import multiprocessing
+import random
+import re
+import resource
+import time
+from typing import Dict, List
+
+import config
+
+WORDS = ("workflow automation platform integration pricing support teams startups webhook trigger "
+         "api connectors reliable scalable enterprise small business self-hosted open source").split()
+
+def make_page(rng: random.Random, products: List[str]) -> bytes:
+    """Страница в духе блога: меню, скрипты, статья ~20-60 КБ, подвал"""
+    paragraphs = []
+    for _ in range(rng.randint(40, 120)):
+        words = [rng.choice(products) if rng.random() < 0.02 else rng.choice(WORDS) for _ in range(rng.randint(40, 90))]
+        paragraphs.append(f"<p>{' '.join(words)}.</p>")
+    nav = ''.join(f'<li><a href="/p{i}">{rng.choice(WORDS)}</a></li>' for i in range(40))
+    scripts = ''.join(f'<script>var x{i} = {{"k": "{rng.choice(WORDS) * 20}"}};</script>' for i in range(10))
+    return (
+        f'<!DOCTYPE html><html><head><title>{rng.choice(WORDS).title()} guide</title>'
+        f'<meta name="description" content="{" ".join(rng.sample(WORDS, 8))}">'
+        f'<style>body {{ color: #333; }}</style>{scripts}</head><body>'
+        f'<header><nav><ul>{nav}</ul></nav></header>'
+        f'<main><article><h1>Guide</h1>{"".join(paragraphs)}</article></main>'
+        f'<aside>{" ".join(rng.choice(WORDS) for _ in range(200))}</aside>'
+        f'<footer>{nav}</footer></body></html>'
+    ).encode('utf-8')
+
+def load_corpus(corpus_dir: str, pages: int) -> List[bytes]:
+    if corpus_dir:
+        corpus = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, '*.html')))[:pages]:
+            with open(path, 'rb') as f:
+                corpus.append(f.read())
+        return corpus
+
+    rng = random.Random(42)
+    products = [config.TARGET_PRODUCT] + config.COMPETITORS
+    return [make_page(rng, products) for _ in range(pages)]
+
+def legacy_parse(content: bytes) -> Dict:
+    """Прежний разбор из WebScraper.scrape_website"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    title = soup.title.string if soup.title else ""
+    for script in soup(["script", "style", "nav", "footer", "header", "aside"]):
+        script.decompose()
+    main_content = soup.find('main') or soup.find('article') or soup.find('div', {'class': 'content'}) or soup
+    text = main_content.get_text(separator=' ', strip=True)
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    text = '\n'.join(chunk for chunk in chunks if chunk)
+
+    mentions = {}
+    text_lower = text.lower()
+    for product in [config.TARGET_PRODUCT] + config.COMPETITORS:
+        if product.lower() in text_lower:
+            pattern = re.compile(r'.{0,50}' + re.escape(product) + r'.{0,50}', re.IGNORECASE)
+            matches = pattern.findall(text)
+            mentions[product] = {'count': len(matches), 'examples': matches[:3]}
+    return {'title': title, 'text': text, 'mentions': mentions}
+
+def run_backend(name: str, corpus_dir: str, pages: int, queue):
+    """Выполняется в отдельном процессе, чтобы пиковая память не смешивалась между бэкендами"""
+    from modules import html_extract
+
+    corpus = load_corpus(corpus_dir, pages)
+    if name == 'legacy':
+        parse = legacy_parse
+    else:
+        extract = html_extract.BACKENDS[name][1]
+        matcher = html_extract.get_product_matcher(tuple([config.TARGET_PRODUCT] + config.COMPETITORS))
+
+        def parse(content):
+            extracted = extract(content)
+            extracted['mentions'] = matcher.find(extracted['text'])
+            return extracted
+
+    parse(corpus[0])
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    text_chars = 0
+    mention_count = 0
+    for content in corpus:
+        result = parse(content)
+        text_chars += len(result['text'])
+        mention_count += sum(found['count'] for found in result['mentions'].values())
+    elapsed = time.perf_counter() - started
+
+    queue.put({
+        'pages_per_sec': len(corpus) / elapsed,
+        'mb_per_sec': sum(len(content) for content in corpus) / elapsed / 1e6,
+        'peak_extra_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb) / 1024,
+        'avg_text_chars': text_chars // len(corpus),
+        'mentions': mention_count
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк извлечения текста из HTML")
+    parser.add_argument('--corpus', help="каталог с сохраненными *.html страницами")
+    parser.add_argument('--pages', type=int, default=200, help="число страниц")
+    args = parser.parse_args()
+
+    from modules import html_extract
+    backends = ['legacy'] + html_extract.available_backends()
+    context = multiprocessing.get_context('spawn')
+
+    print(f"{'Backend':>12} {'Pages/s':>9} {'MB/s':>7} {'Peak +MB':>9} {'Text chars':>11} {'Mentions':>9}")
+    for name in backends:
+        queue = context.Queue()
+        process = context.Process(target=run_backend, args=(name, args.corpus, args.pages, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        print(f"{name:>12} {result['pages_per_sec']:>9.1f} {result['mb_per_sec']:>7.2f} "
+              f"{result['peak_extra_mb']:>9.1f} {result['avg_text_chars']:>11} {result['mentions']:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_mention_matcher.py
+"""
+Бенчмарк поиска упоминаний продуктов
+Сравнивает прежний поиск (отдельный regex на каждый продукт) с однопроходным MentionMatcher
+при росте списка конкурентов от 5 до 500 названий
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import random
+import re
+import time
+from typing import List
+
+from modules.response_analyzer import MentionMatcher, SPECIAL_PATTERNS
+
+FILLER = ("workflow automation platform integration pricing support teams startups "
+          "webhook trigger api connectors reliable scalable enterprise small business").split()
+BASE_PRODUCTS = ["n8n", "Zapier", "Make", "Integromat", "Microsoft Power Automate", "IFTTT"]
+
+def make_competitors(count: int) -> List[str]:
+    """Реальные конкуренты плюс синтетические названия до нужного количества"""
+    rng = random.Random(count)
+    competitors = BASE_PRODUCTS[1:count + 1]
+    while len(competitors) < count:
+        name = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 12)))
+        competitors.append(name.capitalize() + rng.choice(['', ' Flow', ' Hub', '.io', ' Cloud']))
+    return competitors
+
+def make_corpus(size: int, products: List[str], seed: int = 42) -> List[str]:
+    """Синтетические ответы LLM ~2500 символов с редкими упоминаниями продуктов"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        words = []
+        while sum(len(w) + 1 for w in words) < 2500:
+            words.append(rng.choice(products) if rng.random() < 0.03 else rng.choice(FILLER))
+        corpus.append(' '.join(words))
+    return corpus
+
+def legacy_scan(text: str, products: List[str]):
+    """Прежний подход: компиляция и finditer на каждый продукт плюс проход по специальным шаблонам"""
+    hits = []
+    for product in products:
+        pattern = re.compile(rf'\b{re.escape(product)}\b', re.IGNORECASE)
+        hits.extend(m.start() for m in list(pattern.finditer(text))[:3])
+    for pattern, _ in SPECIAL_PATTERNS:
+        hits.extend(m.start() for m in list(re.finditer(pattern, text, re.IGNORECASE))[:2])
+    return hits
+
+def measure(func, corpus: List[str]) -> float:
+    """Среднее время обработки одного ответа в микросекундах"""
+    started = time.perf_counter()
+    for text in corpus:
+        func(text)
+    return (time.perf_counter() - started) / len(corpus) * 1e6
+
+def main():
+    corpus_size = 200
+    print(f"{'Products':>9} {'Legacy, us/resp':>16} {'Matcher, us/resp':>17} {'Speedup':>8}")
+
+    for count in (5, 50, 500):
+        products = ["n8n"] + make_competitors(count)
+        corpus = make_corpus(corpus_size, BASE_PRODUCTS + products)
+        matcher = MentionMatcher(tuple(products))
+
+        legacy_time = measure(lambda text: legacy_scan(text, products), corpus)
+        matcher_time = measure(matcher.find, corpus)
+
+        print(f"{count:>9} {legacy_time:>16.1f} {matcher_time:>17.1f} {legacy_time / matcher_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -36,10 +36,46 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE = "market_analysis.log"
 
 MISTRAL_RATE_LIMIT = 30
+MISTRAL_RATE_BURST = 5
+MISTRAL_MAX_CONCURRENCY = 8
+MISTRAL_POOL_SIZE = 10
+MISTRAL_KEEPALIVE_EXPIRY = 60
+MISTRAL_TIMEOUT = 120
+
+CONTENT_GENERATION_WORKERS = 3
+CONTENT_STREAM = os.getenv("CONTENT_STREAM", "0") == "1"
+
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+LLM_CACHE_TTL_HOURS = 24 * 7
+LLM_CACHE_MAX_ENTRIES = 5000
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "1"))
+ANALYSIS_CHUNK_SIZE = 100
+SCORE_CACHE_MAX_ENTRIES = 100000
+SCORE_CACHE_FILE = "score_cache.json"
+
+DB_BULK_BATCH_SIZE = 1000
+RESPONSE_SCAN_BATCH_SIZE = 500
+SQLITE_BUSY_TIMEOUT_MS = 30000
+
+DASHBOARD_CACHE_TTL = 300
+
+SCRAPER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+SCRAPER_SOURCES_LIMIT = 8
+SCRAPER_MAX_CONCURRENCY = 20
+SCRAPER_PER_HOST_RATE = 30
+SCRAPER_TIMEOUT = 15
+SCRAPER_RETRIES = 3
+SCRAPER_BACKOFF_BASE = 1.0
+HTTP_CACHE_MAX_BYTES = 50 * 1024 * 1024
+SCRAPER_HTML_BACKEND = os.getenv("SCRAPER_HTML_BACKEND", "auto")
+PAGE_STORE_COMPRESSION_LEVEL = 6
+RAW_RESPONSE_COMPRESSION_LEVEL = 6
 
 AUTO_UPDATE_ENABLED = True
 UPDATE_SCHEDULE_HOUR = 12
 UPDATE_QUERIES_COUNT = 15
+DAILY_RUN_RESUME_HOURS = 12
 
 DAILY_QUERIES = [
     f"What's new with {TARGET_PRODUCT} today?",
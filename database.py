@@ -1,7 +1,12 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean
+from sqlalchemy import create_engine, event, inspect, insert, text, Column, Integer, String, Text, Date, DateTime, ForeignKey, Float, Boolean, Index, LargeBinary, UniqueConstraint
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
+from itertools import islice
+import zlib
+from typing import Dict, Iterable, Optional
+import config
 
 Base = declarative_base()
 
@@ -10,29 +15,66 @@ class LLMQuery(Base):
     id = Column(Integer, primary_key=True)
     query_text = Column(Text, nullable=False)
     llm_model = Column(String(100))
+    source = Column(String(50))
     created_at = Column(DateTime, default=datetime.utcnow)
     responses = relationship("LLMResponse", back_populates="query")
 
 class LLMResponse(Base):
     __tablename__ = 'llm_responses'
     id = Column(Integer, primary_key=True)
-    query_id = Column(Integer, ForeignKey('llm_queries.id'))
+    query_id = Column(Integer, ForeignKey('llm_queries.id'), index=True)
     response_text = Column(Text, nullable=False)
+    # Старый формат: несжатая копия ответа, переносится в raw_response_compressed (modules/raw_responses.py)
     full_raw_response = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    raw_response_compressed = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    analyzer_version = Column(Integer)
+    analyzed_at = Column(DateTime)
     query = relationship("LLMQuery", back_populates="responses")
     mentions = relationship("ProductMention", back_populates="response")
 
+    @property
+    def raw_response(self) -> Optional[str]:
+        """Исходный ответ API; пока он совпадает с response_text, отдельно не хранится"""
+        if self.raw_response_compressed is not None:
+            return zlib.decompress(self.raw_response_compressed).decode('utf-8')
+        if self.full_raw_response is not None:
+            return self.full_raw_response
+        return self.response_text
+
+    @raw_response.setter
+    def raw_response(self, raw: Optional[str]):
+        self.full_raw_response = None
+        if raw is None or raw == self.response_text:
+            self.raw_response_compressed = None
+        else:
+            self.raw_response_compressed = zlib.compress(raw.encode('utf-8'), config.RAW_RESPONSE_COMPRESSION_LEVEL)
+
 class ProductMention(Base):
     __tablename__ = 'product_mentions'
+    __table_args__ = (
+        Index('ix_product_mentions_product_sentiment', 'product_name', 'sentiment'),
+    )
     id = Column(Integer, primary_key=True)
-    response_id = Column(Integer, ForeignKey('llm_responses.id'))
+    response_id = Column(Integer, ForeignKey('llm_responses.id'), index=True)
     product_name = Column(String(200), nullable=False)
     context = Column(Text)
     sentiment = Column(String(50))
     attributes = Column(Text)
     response = relationship("LLMResponse", back_populates="mentions")
 
+class MentionDailyRollup(Base):
+    __tablename__ = 'mention_daily_rollup'
+    __table_args__ = (
+        UniqueConstraint('day', 'product_name', 'sentiment', 'query_source', name='uq_mention_daily_rollup'),
+    )
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False, index=True)
+    product_name = Column(String(200), nullable=False)
+    sentiment = Column(String(50), nullable=False)
+    query_source = Column(String(50), nullable=False)
+    mention_count = Column(Integer, default=0)
+
 class AuthoritativeSource(Base):
     __tablename__ = 'authoritative_sources'
     id = Column(Integer, primary_key=True)
@@ -44,12 +86,19 @@ class AuthoritativeSource(Base):
     
 class BlindSpot(Base):
     __tablename__ = 'blind_spots'
+    __table_args__ = (
+        Index('uq_blind_spots_key', 'source_name', 'source_type', 'competitors_key', unique=True),
+    )
     id = Column(Integer, primary_key=True)
     source_name = Column(String(500), nullable=False)
     source_type = Column(String(100))
     competitors = Column(Text)
+    competitors_key = Column(String(500))
     context = Column(Text)
+    occurrence_count = Column(Integer, default=1)
     detected_at = Column(DateTime, default=datetime.utcnow)
+    first_seen_at = Column(DateTime, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, default=datetime.utcnow, index=True)
     resolved = Column(Boolean, default=False)
     resolved_at = Column(DateTime)
     resolution_method = Column(String(200)) 
@@ -65,13 +114,63 @@ class GeneratedContent(Base):
 
 class ReputationTracking(Base):
     __tablename__ = 'reputation_tracking'
+    __table_args__ = (
+        Index('ix_reputation_tracking_date_product', 'date_recorded', 'product_name'),
+    )
     id = Column(Integer, primary_key=True)
     product_name = Column(String(200), nullable=False)
     mention_count = Column(Integer, default=0)
     avg_sentiment_score = Column(Float)
+    share = Column(Float)
     date_recorded = Column(DateTime, default=datetime.utcnow)
 
 
+class LLMCacheEntry(Base):
+    __tablename__ = 'llm_response_cache'
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String(64), nullable=False, unique=True)
+    llm_model = Column(String(100))
+    response_text = Column(Text, nullable=False)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class HTTPCacheEntry(Base):
+    __tablename__ = 'http_cache'
+    id = Column(Integer, primary_key=True)
+    url = Column(String(2000), nullable=False, unique=True)
+    etag = Column(String(500))
+    last_modified = Column(String(100))
+    parsed_data = Column(Text, nullable=False)
+    size_bytes = Column(Integer, default=0)
+    hit_count = Column(Integer, default=0)
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class PageBlob(Base):
+    __tablename__ = 'page_blobs'
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), nullable=False, unique=True)
+    compressed_text = Column(LargeBinary, nullable=False)
+    raw_size = Column(Integer, default=0)
+    stored_size = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PageSnapshot(Base):
+    __tablename__ = 'page_snapshots'
+    __table_args__ = (
+        Index('ix_page_snapshots_url_fetched', 'url', 'fetched_at'),
+    )
+    id = Column(Integer, primary_key=True)
+    url = Column(String(2000), nullable=False)
+    content_hash = Column(String(64), ForeignKey('page_blobs.content_hash'), nullable=False, index=True)
+    title = Column(String(200))
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+
+
 class AnalysisSession(Base):
     __tablename__ = 'analysis_sessions'
     
@@ -87,6 +186,111 @@ class AnalysisSession(Base):
     def __repr__(self):
         return f"<AnalysisSession(id={self.id}, type='{self.session_type}', status='{self.status}')>"
 
-engine = create_engine('sqlite:///ai_pr.db')
+
+class RunManifestItem(Base):
+    __tablename__ = 'run_manifest_items'
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey('analysis_sessions.id'), nullable=False, index=True)
+    query_index = Column(Integer)
+    query_text = Column(Text, nullable=False)
+    status = Column(String(20), default='pending')
+    response_id = Column(Integer, ForeignKey('llm_responses.id'))
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Заполнение добавленных колонок по уже сохраненным данным. Ответы, разобранные до учета версий
+# анализатора, получают версию 1: инкрементальный анализ заменит их упоминания, а не добавит копии
+COLUMN_BACKFILLS = {
+    ('llm_responses', 'analyzer_version'):
+        "UPDATE llm_responses SET analyzer_version = 1 WHERE id IN (SELECT response_id FROM product_mentions)",
+}
+
+def upgrade_schema(engine):
+    """Добавляет в существующие таблицы колонки и индексы, появившиеся в моделях позже"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    backfill = COLUMN_BACKFILLS.get((table.name, column.name))
+                    if backfill:
+                        conn.execute(text(backfill))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def bulk_insert(session, model, rows: Iterable[Dict], batch_size: Optional[int] = None) -> int:
+    """
+    Вставляет строки пачками через insert() + executemany, без создания ORM-объектов.
+    Коммит делает вызывающий код, поэтому все пачки попадают в одну транзакцию.
+    """
+    batch_size = batch_size or config.DB_BULK_BATCH_SIZE
+    rows = iter(rows)
+    inserted = 0
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return inserted
+        session.execute(insert(model.__table__), batch)
+        inserted += len(batch)
+
+FTS_TABLE = 'llm_responses_fts'
+
+def create_fulltext_index(engine) -> bool:
+    """
+    Полнотекстовый индекс FTS5 по текстам ответов (external content - тексты не дублируются).
+    Триггеры обновляют индекс при вставке, изменении и удалении ответов; при создании индекс
+    заполняется по уже сохраненным ответам. Возвращает False, если SQLite собран без FTS5.
+    """
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {'name': FTS_TABLE}).first() is not None
+
+        try:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"response_text, content='llm_responses', content_rowid='id', tokenize='unicode61')"
+            ))
+        except OperationalError:
+            return False
+
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON llm_responses BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, response_text) VALUES (new.id, new.response_text); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON llm_responses BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, response_text) VALUES ('delete', old.id, old.response_text); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF response_text ON llm_responses BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, response_text) VALUES ('delete', old.id, old.response_text); "
+            f"INSERT INTO {FTS_TABLE}(rowid, response_text) VALUES (new.id, new.response_text); END"
+        ))
+
+        if not exists:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+engine = create_engine('sqlite:///ai_pr.db', connect_args={'timeout': config.SQLITE_BUSY_TIMEOUT_MS / 1000})
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL позволяет дашборду читать, пока планировщик пишет"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
 Base.metadata.create_all(engine)
+upgrade_schema(engine)
+FTS_AVAILABLE = create_fulltext_index(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
@@ -47,8 +47,9 @@ def run_full_analysis():
     
     print("\nЭтап 2/5: Анализ упоминаний и тональности")
     try:
-        from modules.response_analyzer import process_all_responses, generate_reputation_report, print_detailed_report
-        process_all_responses()
+        from modules.analysis_pass import run_analysis_pass
+        from modules.response_analyzer import generate_reputation_report, print_detailed_report
+        analysis_result = run_analysis_pass()
         report, total_mentions = generate_reputation_report()
         print_detailed_report(report, total_mentions)
         print("Этап 2 завершен")
@@ -61,7 +62,7 @@ def run_full_analysis():
     print("\nЭтап 3/5: Анализ авторитетных источников")
     try:
         from modules.source_finder import generate_sources_report
-        generate_sources_report()
+        generate_sources_report(analysis_result['sources_report'])
         print("Этап 3 завершен")
     except Exception as e:
         print(f"Ошибка на этапе 3: {e}")
@@ -107,10 +108,11 @@ def run_llm_analysis():
     print("\nЗАПУСК АНАЛИЗА LLM-ОТВЕТОВ...")
     try:
         from modules.llm_query import run_analysis_queries
-        from modules.response_analyzer import process_all_responses, generate_reputation_report, print_detailed_report
+        from modules.analysis_pass import run_analysis_pass
+        from modules.response_analyzer import generate_reputation_report, print_detailed_report
         
         run_analysis_queries()
-        process_all_responses()
+        run_analysis_pass()
         report, total_mentions = generate_reputation_report()
         print_detailed_report(report, total_mentions)
         
@@ -196,9 +198,12 @@ def clear_data():
     
     files_to_remove = [
         "ai_pr.db",
+        "ai_pr.db-wal",
+        "ai_pr.db-shm",
         "sources_report.json",
         "scraped_data.json",
         "roi_report.json",
+        "score_cache.json",
         "technical_ai_content_*.txt",
         "external_content_*.txt",
         "owned_content_*.txt",
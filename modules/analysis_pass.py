@@ -0,0 +1,159 @@
+# modules/analysis_pass.py
+"""
+Общий проход анализа ответов LLM
+Каждый ответ читается из базы один раз. По тексту в памяти проходят два матчера: упоминаний продуктов
+(только для ответов, еще не разобранных текущей версией анализатора) и источников; найденные источники
+идут и в счетчики, и в кандидаты в "слепые пятна". Конкуренты для слепых пятен берутся из
+полнотекстового индекса, одним запросом на пачку.
+Упоминания пишутся после каждой пачки ответов, источники и слепые пятна - в конце прохода.
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from database import SessionLocal, LLMResponse
+from modules import blind_spots as blind_spot_store
+from modules.response_analyzer import (
+    ANALYZER_VERSION, extract_product_mentions_fixed, init_analysis_worker, prepare_mention_tables,
+    save_chunk_results, score_cache
+)
+from modules.response_stream import iter_response_batches
+from modules.source_finder import (
+    SourceCollector, blind_spot_competitors, blind_spot_occurrences, build_sources_report,
+    extract_cited_sources, save_authoritative_sources, save_blind_spots
+)
+import config
+
+logger = logging.getLogger(__name__)
+
+BatchResult = Tuple[List[Tuple[int, List[Dict]]], SourceCollector, blind_spot_store.GapAggregator]
+
+def analyze_batch(db, batch: List[Tuple[int, str, Optional[int]]]) -> BatchResult:
+    """
+    Пачка строк (id, текст, версия анализатора) -> упоминания для неразобранных ответов,
+    источники и пробелы пачки. В БД не пишет.
+    """
+    competitors_by_response = blind_spot_competitors(db, [response_id for response_id, _, _ in batch])
+    mention_results = []
+    sources = SourceCollector()
+    gaps = blind_spot_store.GapAggregator()
+
+    for response_id, response_text, analyzer_version in batch:
+        response_text = response_text or ""
+
+        if analyzer_version != ANALYZER_VERSION:
+            try:
+                mention_results.append((response_id, extract_product_mentions_fixed(response_text)))
+            except Exception as e:
+                logger.error(f"Error processing response {response_id}: {e}")
+
+        is_source_response = len(response_text) > SourceCollector.MIN_RESPONSE_LENGTH
+        competitors = competitors_by_response.get(response_id)
+        if not is_source_response and not competitors:
+            continue
+
+        cited = extract_cited_sources(response_text)
+        if is_source_response:
+            sources.add(cited)
+        if competitors:
+            for occurrence in blind_spot_occurrences(response_id, competitors, cited):
+                gaps.add(occurrence)
+
+    return mention_results, sources, gaps
+
+def analyze_batch_in_worker(response_ids: List[int]) -> Tuple[BatchResult, Dict]:
+    """Обработка пачки в воркере: тексты читает сам, возвращает результаты и новые записи кэша оценок"""
+    db = SessionLocal()
+    try:
+        batch = db.query(LLMResponse.id, LLMResponse.response_text, LLMResponse.analyzer_version).filter(
+            LLMResponse.id.in_(response_ids)
+        ).order_by(LLMResponse.id).all()
+        result = analyze_batch(db, batch)
+    finally:
+        db.close()
+
+    return result, score_cache.drain()
+
+def run_analysis_pass(full_rebuild: bool = False, workers: Optional[int] = None) -> Dict:
+    """
+    Упоминания, источники и слепые пятна за один обход таблицы ответов.
+    workers > 1 распределяет пачки ответов по процессам, запись в БД делает родительский процесс.
+    Возвращает {'mentions_saved', 'responses_analyzed', 'sources_report'};
+    sources_report можно передать в generate_sources_report без повторного анализа.
+    """
+    workers = config.ANALYSIS_WORKERS if workers is None else workers
+    db = SessionLocal()
+    started = time.perf_counter()
+    seen_at = datetime.utcnow()
+
+    try:
+        prepare_mention_tables(db, full_rebuild)
+        score_cache.load()
+
+        total_responses = db.query(func.count(LLMResponse.id)).scalar()
+        chunk_size = config.ANALYSIS_CHUNK_SIZE
+        logger.info(f"Analysis pass over {total_responses} responses "
+                    f"(analyzer version {ANALYZER_VERSION}, workers: {workers})")
+
+        sources = SourceCollector()
+        gaps = blind_spot_store.GapAggregator()
+        mentions_saved = 0
+        responses_analyzed = 0
+        scanned = 0
+
+        def save(result: BatchResult, batch_size: int):
+            nonlocal mentions_saved, responses_analyzed, scanned
+            mention_results, batch_sources, batch_gaps = result
+            sources.merge(batch_sources)
+            gaps.merge(batch_gaps)
+            try:
+                mentions_saved += save_chunk_results(db, mention_results)
+                responses_analyzed += len(mention_results)
+            except Exception as e:
+                logger.error(f"Error saving mentions for responses {mention_results[0][0]}..{mention_results[-1][0]}: {e}")
+                db.rollback()
+
+            scanned += batch_size
+            logger.info(f"Scanned {scanned}/{total_responses} responses, new mentions: {mentions_saved}")
+
+        if workers > 1 and total_responses > chunk_size:
+            # Воркерам передаются только id, тексты каждый воркер читает сам
+            chunks = [[response_id for response_id, in batch]
+                      for batch in iter_response_batches(db, LLMResponse.id, batch_size=chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_analysis_worker) as executor:
+                for chunk, (result, cache_delta) in zip(chunks, executor.map(analyze_batch_in_worker, chunks)):
+                    score_cache.merge(cache_delta['entries'], cache_delta['hits'], cache_delta['misses'])
+                    save(result, len(chunk))
+        else:
+            for batch in iter_response_batches(db, LLMResponse.response_text, LLMResponse.analyzer_version,
+                                               batch_size=chunk_size):
+                save(analyze_batch(db, batch), len(batch))
+
+        save_authoritative_sources(db, sources)
+        blind_spots = save_blind_spots(db, gaps.rows(), seen_at)
+
+    finally:
+        db.close()
+        score_cache.save()
+
+    logger.info(f"Analysis pass completed in {time.perf_counter() - started:.1f}s: "
+                f"{responses_analyzed} responses re-analyzed, {mentions_saved} mentions, "
+                f"{len(sources.source_counter)} sources, {len(blind_spots)} blind spots")
+
+    return {
+        'mentions_saved': mentions_saved,
+        'responses_analyzed': responses_analyzed,
+        'sources_report': build_sources_report(sources, total_responses, blind_spots)
+    }
+
+if __name__ == "__main__":
+    workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else None
+    run_analysis_pass(full_rebuild='--full-rebuild' in sys.argv, workers=workers)
@@ -0,0 +1,168 @@
+# modules/blind_spots.py
+"""
+Хранилище "слепых пятен" - источников, где упоминаются конкуренты, но не целевой продукт
+Одна строка на пробел (источник, тип источника, набор конкурентов): повторные запуски анализа
+обновляют число ответов и время последнего обнаружения, отметка resolved сохраняется.
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import BlindSpot
+
+KEY_COLUMNS = ['source_name', 'source_type', 'competitors_key']
+
+def competitors_key(competitors: Iterable[str]) -> str:
+    return '|'.join(sorted(set(competitors)))
+
+class GapAggregator:
+    """
+    Сворачивает найденные пары (ответ, источник) в пробелы.
+    occurrence_count - число разных ответов, контекст - из первого из них.
+    """
+
+    def __init__(self):
+        self.gaps = {}
+
+    def add(self, spot: Dict):
+        key = (spot['source_name'], spot['source_type'], competitors_key(spot['competitors_mentioned']))
+        gap = self.gaps.get(key)
+        if gap is None:
+            gap = self.gaps[key] = {
+                'source_name': key[0],
+                'source_type': key[1],
+                'competitors_key': key[2],
+                'competitors': json.dumps(sorted(set(spot['competitors_mentioned']))),
+                'context': spot['context_en'][:500],
+                'response_ids': set()
+            }
+        gap['response_ids'].add(spot['response_id'])
+
+    def merge(self, other: 'GapAggregator'):
+        """Добавляет пробелы другого агрегатора; контекст остается от того, что добавлен раньше"""
+        for key, other_gap in other.gaps.items():
+            gap = self.gaps.get(key)
+            if gap is None:
+                self.gaps[key] = dict(other_gap, response_ids=set(other_gap['response_ids']))
+            else:
+                gap['response_ids'] |= other_gap['response_ids']
+
+    def rows(self) -> List[Dict]:
+        return [
+            {**{k: v for k, v in gap.items() if k != 'response_ids'}, 'occurrence_count': len(gap['response_ids'])}
+            for gap in self.gaps.values()
+        ]
+
+def aggregate(occurrences: Iterable[Dict]) -> List[Dict]:
+    aggregator = GapAggregator()
+    for spot in occurrences:
+        aggregator.add(spot)
+    return aggregator.rows()
+
+def upsert(db, gaps: List[Dict], seen_at: Optional[datetime] = None) -> int:
+    """
+    Сохраняет пробелы одного полного прохода по ответам. Коммит делает вызывающий код.
+    Число ответов заменяется текущим (проход видит все ответы), first_seen_at и resolved не меняются.
+    """
+    if not gaps:
+        return 0
+
+    compact_legacy_rows(db)
+    seen_at = seen_at or datetime.utcnow()
+    rows = [dict(gap, detected_at=seen_at, first_seen_at=seen_at, last_seen_at=seen_at, resolved=False)
+            for gap in gaps]
+
+    stmt = sqlite_insert(BlindSpot.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=KEY_COLUMNS,
+        set_={
+            'occurrence_count': stmt.excluded.occurrence_count,
+            'context': stmt.excluded.context,
+            'last_seen_at': stmt.excluded.last_seen_at
+        }
+    )
+    db.execute(stmt, rows)
+    return len(rows)
+
+def compact_legacy_rows(db) -> int:
+    """
+    Сворачивает строки, записанные до появления ключа (по строке на ответ и запуск), в пробелы.
+    Число ответов оценивается по разным контекстам, resolved переносится, если был отмечен у любой копии.
+    """
+    legacy = db.query(BlindSpot).filter(BlindSpot.competitors_key.is_(None)).order_by(BlindSpot.id)
+    if legacy.first() is None:
+        return 0
+
+    gaps = {}
+    for spot in legacy.yield_per(1000):
+        competitors = json.loads(spot.competitors or '[]')
+        key = (spot.source_name, spot.source_type, competitors_key(competitors))
+        detected_at = spot.detected_at or datetime.utcnow()
+        gap = gaps.get(key)
+        if gap is None:
+            gap = gaps[key] = {
+                'source_name': key[0],
+                'source_type': key[1],
+                'competitors_key': key[2],
+                'competitors': json.dumps(sorted(set(competitors))),
+                'contexts': set(),
+                'detected_at': detected_at,
+                'first_seen_at': detected_at,
+                'last_seen_at': detected_at,
+                'resolved': False,
+                'resolved_at': None,
+                'resolution_method': None
+            }
+        gap['contexts'].add(spot.context)
+        gap['context'] = spot.context
+        gap['first_seen_at'] = min(gap['first_seen_at'], detected_at)
+        gap['last_seen_at'] = max(gap['last_seen_at'], detected_at)
+        if spot.resolved and (gap['resolved_at'] is None or (spot.resolved_at and spot.resolved_at > gap['resolved_at'])):
+            gap.update(resolved=True, resolved_at=spot.resolved_at, resolution_method=spot.resolution_method)
+
+    deleted = db.query(BlindSpot).filter(BlindSpot.competitors_key.is_(None)).delete(synchronize_session=False)
+    for gap in gaps.values():
+        gap['occurrence_count'] = len(gap.pop('contexts'))
+        gap['detected_at'] = gap['first_seen_at']
+    db.execute(sqlite_insert(BlindSpot.__table__).on_conflict_do_nothing(index_elements=KEY_COLUMNS),
+               list(gaps.values()))
+
+    print(f"Слепые пятна: {deleted} старых записей свернуто в {len(gaps)}")
+    return deleted
+
+def get_blind_spots(db, include_resolved: bool = False, seen_since: Optional[datetime] = None,
+                    limit: Optional[int] = None) -> List[Dict]:
+    """Пробелы по убыванию числа ответов"""
+    query = db.query(BlindSpot).filter(BlindSpot.competitors_key.isnot(None))
+    if not include_resolved:
+        query = query.filter(BlindSpot.resolved.isnot(True))
+    if seen_since is not None:
+        query = query.filter(BlindSpot.last_seen_at >= seen_since)
+    query = query.order_by(BlindSpot.occurrence_count.desc(), BlindSpot.last_seen_at.desc())
+    if limit:
+        query = query.limit(limit)
+
+    return [{
+        'id': spot.id,
+        'source_name': spot.source_name,
+        'source_type': spot.source_type,
+        'competitors_mentioned': json.loads(spot.competitors or '[]'),
+        'context_en': spot.context,
+        'occurrences': spot.occurrence_count,
+        'first_seen': spot.first_seen_at,
+        'last_seen': spot.last_seen_at,
+        'resolved': bool(spot.resolved)
+    } for spot in query]
+
+def mark_resolved(db, blind_spot_id: int, method: str):
+    db.query(BlindSpot).filter_by(id=blind_spot_id).update({
+        BlindSpot.resolved: True,
+        BlindSpot.resolved_at: datetime.utcnow(),
+        BlindSpot.resolution_method: method[:200]
+    }, synchronize_session=False)
@@ -8,37 +8,85 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
-from mistralai import Mistral
+import asyncio
 import json
-from typing import Dict, List
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 from database import SessionLocal, GeneratedContent, ProductMention
 import config
 from collections import Counter
+from modules import mistral_client
+from modules import llm_cache
+from modules.products import product_filter
+from modules.rate_limit import TokenBucket
 
-def query_mistral(prompt: str, model: str = config.MISTRAL_MODEL) -> str:
+def query_mistral(prompt: str, model: str = config.MISTRAL_MODEL, use_cache: bool = True) -> str:
     """Query Mistral AI"""
+    params = {'temperature': 0.7, 'max_tokens': 2000}
+    cache_key = llm_cache.make_key(model, prompt, **params)
+
+    if llm_cache.is_enabled(use_cache):
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached.strip()
+
     try:
-        client = Mistral(api_key=config.MISTRAL_API_KEY)
-        
-        response = client.chat.complete(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=2000
-        )
+        response = mistral_client.chat_complete(prompt, model=model, **params)
         
-        return response.choices[0].message.content.strip()
+        content = response.choices[0].message.content or ""
+        llm_cache.put(cache_key, model, content)
+        return content.strip()
             
     except Exception as e:
         print(f"Ошибка при запросе к Mistral AI: {e}")
         return ""
 
+async def query_mistral_async(prompt: str, model: str = config.MISTRAL_MODEL, use_cache: bool = True,
+                              limiter: Optional[TokenBucket] = None,
+                              on_token: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Асинхронный запрос к Mistral AI; с on_token ответ получается потоком и передается по фрагментам.
+    Кэш - запись в SQLite, поэтому чтение и сохранение идут в отдельном потоке.
+    """
+    params = {'temperature': 0.7, 'max_tokens': 2000}
+    cache_key = llm_cache.make_key(model, prompt, **params)
+
+    if llm_cache.is_enabled(use_cache):
+        cached = await asyncio.to_thread(llm_cache.get, cache_key)
+        if cached is not None:
+            return cached.strip()
+
+    try:
+        if limiter:
+            await limiter.acquire()
+
+        if on_token:
+            chunks = []
+            async for chunk in mistral_client.chat_stream_async(prompt, model=model, **params):
+                chunks.append(chunk)
+                on_token(chunk)
+            content = ''.join(chunks)
+        else:
+            response = await mistral_client.chat_complete_async(prompt, model=model, **params)
+            content = response.choices[0].message.content or ""
+
+        await asyncio.to_thread(llm_cache.put, cache_key, model, content)
+        return content.strip()
+
+    except Exception as e:
+        print(f"Ошибка при запросе к Mistral AI: {e}")
+        return ""
+
+def clean_content(content: str) -> str:
+    """Убирает символы markdown"""
+    return content.replace("*", "").replace("#", "").strip()
+
 def collect_product_info() -> Dict:
     """Собирает информацию о продукте из базы данных"""
     db = SessionLocal()
 
     mentions = db.query(ProductMention).filter(
-        ProductMention.product_name.ilike(f"%{config.TARGET_PRODUCT}%")
+        product_filter(config.TARGET_PRODUCT)
     ).all()
     
     product_info = {
@@ -123,7 +171,7 @@ def get_competitor_analysis() -> Dict:
     
     for competitor in config.COMPETITORS:
         mentions = db.query(ProductMention).filter(
-            ProductMention.product_name.ilike(f"%{competitor}%")
+            product_filter(competitor)
         ).all()
         
         if mentions:
@@ -152,8 +200,8 @@ def get_competitor_analysis() -> Dict:
     db.close()
     return competitor_data
 
-def generate_technical_content(product_info: Dict, competitor_analysis: Dict) -> str:
-    """Генерирует технический контент для ИИ (английский)"""
+def technical_prompt(product_info: Dict, competitor_analysis: Dict) -> str:
+    """Промпт технического контента для ИИ (английский)"""
 
     competitor_advantages = {}
     for competitor, data in competitor_analysis.items():
@@ -203,15 +251,17 @@ Tone: Professional, technical, objective
 Length: 800-1200 words
 Audience: AI systems processing technical information"""
 
-    content = query_mistral(prompt)
-    content = content.replace("*", "").replace("#", "").strip()
+    return prompt
 
+def generate_technical_content(product_info: Dict, competitor_analysis: Dict) -> str:
+    """Генерирует технический контент для ИИ (английский)"""
+    content = clean_content(query_mistral(technical_prompt(product_info, competitor_analysis)))
     print(f"Сгенерирован технический контент: {len(content)} символов")
     
     return content
 
-def generate_external_content(product_info: Dict, source_style: str) -> str:
-    """Генерирует контент для внешних площадок (Medium, Dev.to)"""
+def external_prompt(product_info: Dict, source_style: str) -> str:
+    """Промпт статьи для внешних площадок (Medium, Dev.to)"""
     
     prompt = f"""Write an engaging, informative article about {product_info['name']} 
     for publication on technical blogs like Medium, Dev.to, or Hashnode.
@@ -254,14 +304,17 @@ Length: 1200-1800 words
 Language: English only
 Format: Blog post with subheadings, bullet points, code blocks"""
 
-    content = query_mistral(prompt)
-    content = content.replace("*", "").replace("#", "").strip()
+    return prompt
+
+def generate_external_content(product_info: Dict, source_style: str) -> str:
+    """Генерирует контент для внешних площадок (Medium, Dev.to)"""
+    content = clean_content(query_mistral(external_prompt(product_info, source_style)))
     print(f"Сгенерирован контент для внешних площадок: {len(content)} символов")
     
     return content
 
-def generate_owned_content(product_info: Dict) -> str:
-    """Генерирует контент для собственных каналов (блог, документация)"""
+def owned_prompt(product_info: Dict) -> str:
+    """Промпт контента для собственных каналов (блог, документация)"""
     
     prompt = f"""Create comprehensive documentation/content for {product_info['name']}'s 
     official channels (website blog, documentation, knowledge base).
@@ -304,8 +357,11 @@ Length: 1500-2500 words (comprehensive)
 Language: English only
 Format: Documentation with hierarchy (H2, H3, bullet points, code blocks)"""
 
-    content = query_mistral(prompt)
-    content = content.replace("*", "").replace("#", "").strip()
+    return prompt
+
+def generate_owned_content(product_info: Dict) -> str:
+    """Генерирует контент для собственных каналов (блог, документация)"""
+    content = clean_content(query_mistral(owned_prompt(product_info)))
     print(f"Сгенерирован контент для собственных каналов: {len(content)} символов")
     
     return content
@@ -375,9 +431,81 @@ def generate_gap_recommendations(self, top_gaps: List[Dict]) -> List[str]:
     
     return recommendations
 
-def run_content_generation():
-    """Запускает генерацию всех типов контента"""
+PART_SUFFIX = ".part"
+
+def save_document(content_type: str, filename: str, content: str):
+    """Сохраняет готовый документ в базу и в файл (через временный файл, прежний документ заменяется целиком)"""
     db = SessionLocal()
+    try:
+        db.add(GeneratedContent(
+            content_type=content_type,
+            target_product=config.TARGET_PRODUCT,
+            content_text=content,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    part_filename = filename + PART_SUFFIX
+    with open(part_filename, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(part_filename, filename)
+
+async def generate_documents(jobs: List[Tuple[str, str, str, str]], stream: bool = False,
+                             workers: Optional[int] = None) -> Dict[str, str]:
+    """
+    Генерирует документы параллельно, не больше workers запросов одновременно.
+    jobs - (тип контента, название, промпт, файл). Каждый документ сохраняется сразу после готовности.
+    stream=True пишет ответ по мере генерации в файл.part; прежний документ заменяется только готовым
+    очищенным текстом, при ошибке файл.part удаляется.
+    """
+    bucket = TokenBucket(config.MISTRAL_RATE_LIMIT, config.MISTRAL_RATE_BURST)
+    semaphore = asyncio.Semaphore(workers or config.CONTENT_GENERATION_WORKERS)
+
+    async def worker(content_type: str, title: str, prompt: str, filename: str) -> Tuple[str, str, str, str, float]:
+        async with semaphore:
+            started = time.perf_counter()
+            print(f"Генерация: {title}")
+
+            if stream:
+                part_filename = filename + PART_SUFFIX
+                content = ""
+                try:
+                    with open(part_filename, "w", encoding="utf-8") as f:
+                        def write_chunk(chunk: str):
+                            f.write(chunk)
+                            f.flush()
+                        content = await query_mistral_async(prompt, limiter=bucket, on_token=write_chunk)
+                finally:
+                    if not clean_content(content) and os.path.exists(part_filename):
+                        os.remove(part_filename)
+            else:
+                content = await query_mistral_async(prompt, limiter=bucket)
+
+            return content_type, title, filename, clean_content(content), time.perf_counter() - started
+
+    results = {}
+    tasks = [asyncio.create_task(worker(*job)) for job in jobs]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            content_type, title, filename, content, elapsed = await finished
+            if not content:
+                print(f"Не удалось сгенерировать: {title}")
+                continue
+
+            await asyncio.to_thread(save_document, content_type, filename, content)
+            results[content_type] = content
+            print(f"Сохранено: {filename} ({len(content)} символов, {elapsed:.1f} с)")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await mistral_client.close_async_client()
+
+    return results
+
+def run_content_generation(stream: Optional[bool] = None, workers: Optional[int] = None):
+    """Запускает генерацию всех типов контента; три документа генерируются параллельно"""
+    stream = config.CONTENT_STREAM if stream is None else stream
     
     print("="*60)
     print("ЗАПУСК ГЕНЕРАЦИИ КОНТЕНТА ДЛЯ ИИ-ПИАРА")
@@ -390,71 +518,29 @@ def run_content_generation():
     print(f"   Анализировано: {product_info['total_mentions']} упоминаний {config.TARGET_PRODUCT}")
     print(f"   Конкуренты в анализе: {len(competitor_analysis)}")
 
-    print(f"\nГЕНЕРАЦИЯ ТЕХНИЧЕСКОГО КОНТЕНТА (для ИИ)")
-    technical_content = generate_technical_content(product_info, competitor_analysis)
-    
-    if technical_content:
-        tech_record = GeneratedContent(
-            content_type='technical_ai',
-            target_product=config.TARGET_PRODUCT,
-            content_text=technical_content,
-        )
-        db.add(tech_record)
-
-        tech_filename = f"technical_ai_content_{config.TARGET_PRODUCT}.txt"
-        with open(tech_filename, "w", encoding="utf-8") as f:
-            f.write(technical_content)
-        
-        print(f"Сохранено: {tech_filename}")
-        print(f"Размер: {len(technical_content)} символов")
-
-    print(f"\nГЕНЕРАЦИЯ КОНТЕНТА ДЛЯ ВНЕШНИХ ПЛОЩАДОК")
-    external_content = generate_external_content(product_info, "technical but engaging")
-    
-    if external_content:
-        ext_record = GeneratedContent(
-            content_type='external_platform',
-            target_product=config.TARGET_PRODUCT,
-            content_text=external_content,
-        )
-        db.add(ext_record)
-        
-        ext_filename = f"external_content_{config.TARGET_PRODUCT}.txt"
-        with open(ext_filename, "w", encoding="utf-8") as f:
-            f.write(external_content)
-        
-        print(f"Сохранено: {ext_filename}")
-        print(f"Размер: {len(external_content)} символов")
-
-    print(f"\nГЕНЕРАЦИЯ КОНТЕНТА ДЛЯ СОБСТВЕННЫХ КАНАЛОВ")
-    owned_content = generate_owned_content(product_info)
-    
-    if owned_content:
-        owned_record = GeneratedContent(
-            content_type='owned_channels',
-            target_product=config.TARGET_PRODUCT,
-            content_text=owned_content,
-        )
-        db.add(owned_record)
-        
-        owned_filename = f"owned_content_{config.TARGET_PRODUCT}.txt"
-        with open(owned_filename, "w", encoding="utf-8") as f:
-            f.write(owned_content)
-        
-        print(f"Сохранено: {owned_filename}")
-        print(f"Размер: {len(owned_content)} символов")
+    jobs = [
+        ('technical_ai', "технический контент (для ИИ)",
+         technical_prompt(product_info, competitor_analysis), f"technical_ai_content_{config.TARGET_PRODUCT}.txt"),
+        ('external_platform', "контент для внешних площадок",
+         external_prompt(product_info, "technical but engaging"), f"external_content_{config.TARGET_PRODUCT}.txt"),
+        ('owned_channels', "контент для собственных каналов",
+         owned_prompt(product_info), f"owned_content_{config.TARGET_PRODUCT}.txt"),
+    ]
 
-    db.commit()
-    db.close()
+    print(f"\nГЕНЕРАЦИЯ КОНТЕНТА ({len(jobs)} документа, параллельно)")
+    started = time.perf_counter()
+    results = asyncio.run(generate_documents(jobs, stream=stream, workers=workers))
     
     print(f"\n" + "="*60)
     print("ГЕНЕРАЦИЯ КОНТЕНТА ЗАВЕРШЕНА!")
     print("="*60)
+    print(f"\nСгенерировано документов: {len(results)}/{len(jobs)} за {time.perf_counter() - started:.1f} с")
     print(f"\nСгенерированные файлы:")
-    print(f"   • technical_ai_content_{config.TARGET_PRODUCT}.txt")
-    print(f"   • external_content_{config.TARGET_PRODUCT}.txt")
-    print(f"   • owned_content_{config.TARGET_PRODUCT}.txt")
+    for content_type, _, _, filename in jobs:
+        if content_type in results:
+            print(f"   • {filename}")
     print(f"\nВсе записи сохранены в базу данных.")
+    print(mistral_client.format_stats())
     print("="*60)
 
 if __name__ == "__main__":
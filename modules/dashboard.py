@@ -15,8 +15,151 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
-from database import SessionLocal, ProductMention, LLMResponse, GeneratedContent, AnalysisSession
+from sqlalchemy import case, func, text
+from database import SessionLocal, ProductMention, GeneratedContent, AnalysisSession, engine
 import config
+from modules.products import normalize_product_name_fixed
+from modules.rollup import get_daily_product_counts
+from modules.reputation_tracker import get_reputation_history
+from modules.text_search import search_responses
+
+def get_data_version():
+    """
+    Отметка последней записи в базу: размер и время изменения файла БД и WAL-журнала.
+    Входит в ключ кэша загрузчиков, поэтому любая запись сбрасывает кэш без ожидания TTL.
+    """
+    version = []
+    for path in (engine.url.database, f"{engine.url.database}-wal"):
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+@st.cache_data(ttl=config.DASHBOARD_CACHE_TTL, show_spinner=False)
+def load_mentions_over_time(data_version, days_back):
+    db = SessionLocal()
+    try:
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days_back)
+        
+        result = [
+            {'date': day, 'product': product, 'count': count}
+            for day, product, count in get_daily_product_counts(db, start_date.date(), end_date.date())
+        ]
+        
+        return pd.DataFrame(result) if result else pd.DataFrame()
+        
+    finally:
+        db.close()
+
+@st.cache_data(ttl=config.DASHBOARD_CACHE_TTL, show_spinner=False)
+def load_reputation_trend(data_version, bucket, days_back):
+    db = SessionLocal()
+    try:
+        end_day = datetime.utcnow().date()
+        history = get_reputation_history(db, end_day - timedelta(days=days_back), end_day, bucket=bucket)
+        return pd.DataFrame(history) if history else pd.DataFrame()
+    finally:
+        db.close()
+
+@st.cache_data(ttl=config.DASHBOARD_CACHE_TTL, show_spinner=False)
+def load_product_stats(data_version):
+    """Тональность и топ атрибутов по продуктам - два GROUP BY вместо загрузки всех упоминаний"""
+    db = SessionLocal()
+    try:
+        display_names = {}
+        for product in [config.TARGET_PRODUCT] + config.COMPETITORS:
+            display_names.setdefault(normalize_product_name_fixed(product), product)
+        
+        sentiment_rows = db.query(
+            ProductMention.product_name,
+            ProductMention.sentiment,
+            func.count(ProductMention.id)
+        ).filter(ProductMention.product_name.in_(display_names)).group_by(
+            ProductMention.product_name, ProductMention.sentiment
+        )
+        
+        product_stats = {}
+        for product_name, sentiment, count in sentiment_rows:
+            stats = product_stats.setdefault(display_names[product_name], {
+                'total': 0,
+                'sentiment': {'positive': 0, 'neutral': 0, 'negative': 0},
+                'top_attributes': []
+            })
+            stats['total'] += count
+            if sentiment in stats['sentiment']:
+                stats['sentiment'][sentiment] += count
+        
+        attribute = func.json_each(ProductMention.attributes).table_valued('value')
+        attribute_rows = db.query(
+            ProductMention.product_name,
+            attribute.c.value,
+            func.count()
+        ).select_from(ProductMention).join(attribute, text('1 = 1')).filter(
+            ProductMention.product_name.in_(display_names),
+            func.json_valid(ProductMention.attributes)
+        ).group_by(ProductMention.product_name, attribute.c.value).order_by(
+            ProductMention.product_name, func.count().desc()
+        )
+        
+        for product_name, value, count in attribute_rows:
+            top_attributes = product_stats[display_names[product_name]]['top_attributes']
+            if len(top_attributes) < 3:
+                top_attributes.append((value, count))
+        
+        for stats in product_stats.values():
+            total = stats['total']
+            stats['positive_percentage'] = (stats['sentiment']['positive'] / total * 100) if total > 0 else 0
+            stats['mentions_per_day'] = round(total / 7, 1) if total > 0 else 0
+        
+        return {
+            product: product_stats[product]
+            for product in display_names.values() if product in product_stats
+        }
+    finally:
+        db.close()
+
+@st.cache_data(ttl=config.DASHBOARD_CACHE_TTL, show_spinner=False)
+def load_roi_data(data_version):
+    db = SessionLocal()
+    try:
+        target_name = normalize_product_name_fixed(config.TARGET_PRODUCT)
+        is_target = ProductMention.product_name == target_name
+        content_items = db.query(GeneratedContent).count()
+        total_mentions, target_mentions, positive_target_mentions = db.query(
+            func.count(ProductMention.id),
+            func.coalesce(func.sum(case((is_target, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((is_target & (ProductMention.sentiment == 'positive'), 1), else_=0)), 0)
+        ).one()
+        positive_pct = (positive_target_mentions / target_mentions * 100) if target_mentions > 0 else 0
+        content_cost = content_items * 50
+        estimated_value = positive_target_mentions * 100
+        roi_percentage = ((estimated_value - content_cost) / content_cost * 100) if content_cost > 0 else 0
+        
+        return {
+            'content_items': content_items,
+            'total_mentions': total_mentions,
+            'target_mentions': target_mentions,
+            'positive_target_mentions': positive_target_mentions,
+            'positive_percentage': positive_pct,
+            'content_cost': content_cost,
+            'estimated_value': estimated_value,
+            'roi_percentage': roi_percentage
+        }
+        
+    finally:
+        db.close()
+
+@st.cache_data(ttl=config.DASHBOARD_CACHE_TTL, show_spinner=False)
+def load_search_results(data_version, query, limit):
+    db = SessionLocal()
+    try:
+        results = search_responses(db, query, limit)
+        return pd.DataFrame(results) if results else pd.DataFrame()
+    finally:
+        db.close()
 
 class Dashboard:
     def __init__(self):
@@ -54,120 +197,19 @@ class Dashboard:
     
     def get_mentions_over_time(self, days_back=30):
         """Получает данные об упоминаниях за период"""
-        db = SessionLocal()
-        try:
-            end_date = datetime.utcnow()
-            start_date = end_date - timedelta(days=days_back)
-            
-            mentions = db.query(
-                ProductMention,
-                LLMResponse.created_at
-            ).join(LLMResponse).filter(
-                LLMResponse.created_at >= start_date,
-                LLMResponse.created_at <= end_date
-            ).all()
-            
-            timeline_data = {}
-            
-            for mention, created_at in mentions:
-                date = created_at.date()
-                product = mention.product_name
-                
-                if date not in timeline_data:
-                    timeline_data[date] = {}
-                
-                if product not in timeline_data[date]:
-                    timeline_data[date][product] = 0
-                
-                timeline_data[date][product] += 1
-
-            result = []
-            for date, products in timeline_data.items():
-                for product, count in products.items():
-                    result.append({
-                        'date': date,
-                        'product': product,
-                        'count': count
-                    })
-            
-            return pd.DataFrame(result) if result else pd.DataFrame()
-            
-        finally:
-            db.close()
+        return load_mentions_over_time(get_data_version(), days_back)
+    
+    def get_reputation_trend(self, bucket='week', days_back=365):
+        """Долгосрочная динамика по снимкам репутации"""
+        return load_reputation_trend(get_data_version(), bucket, days_back)
     
     def get_product_stats(self):
         """Получает статистику по продуктам"""
-        db = SessionLocal()
-        try:
-            all_products = [config.TARGET_PRODUCT] + config.COMPETITORS
-            product_stats = {}
-            
-            for product in all_products:
-                mentions = db.query(ProductMention).filter(
-                    ProductMention.product_name.ilike(f"%{product}%")
-                ).all()
-                
-                if mentions:
-                    total = len(mentions)
-                    sentiment_counts = {'positive': 0, 'neutral': 0, 'negative': 0}
-                    
-                    for mention in mentions:
-                        if mention.sentiment in sentiment_counts:
-                            sentiment_counts[mention.sentiment] += 1
-                    positive_pct = (sentiment_counts['positive'] / total * 100) if total > 0 else 0
-                    all_attributes = []
-                    for mention in mentions:
-                        if mention.attributes:
-                            import json
-                            try:
-                                attrs = json.loads(mention.attributes)
-                                all_attributes.extend(attrs)
-                            except:
-                                pass
-                    from collections import Counter
-                    top_attributes = Counter(all_attributes).most_common(3)
-                    
-                    product_stats[product] = {
-                        'total': total,
-                        'sentiment': sentiment_counts,
-                        'positive_percentage': positive_pct,
-                        'top_attributes': top_attributes,
-                        'mentions_per_day': round(total / 7, 1) if total > 0 else 0
-                    }
-            return product_stats
-        finally:
-            db.close()
+        return load_product_stats(get_data_version())
+    
     def get_roi_data(self):
         """Рассчитывает данные ROI"""
-        db = SessionLocal()
-        try:
-            content_items = db.query(GeneratedContent).count()
-            total_mentions = db.query(ProductMention).count()
-            target_mentions = db.query(ProductMention).filter(
-                ProductMention.product_name.ilike(f"%{config.TARGET_PRODUCT}%")
-            ).count()
-            positive_target_mentions = db.query(ProductMention).filter(
-                ProductMention.product_name.ilike(f"%{config.TARGET_PRODUCT}%"),
-                ProductMention.sentiment == 'positive'
-            ).count()
-            positive_pct = (positive_target_mentions / target_mentions * 100) if target_mentions > 0 else 0
-            content_cost = content_items * 50
-            estimated_value = positive_target_mentions * 100
-            roi_percentage = ((estimated_value - content_cost) / content_cost * 100) if content_cost > 0 else 0
-            
-            return {
-                'content_items': content_items,
-                'total_mentions': total_mentions,
-                'target_mentions': target_mentions,
-                'positive_target_mentions': positive_target_mentions,
-                'positive_percentage': positive_pct,
-                'content_cost': content_cost,
-                'estimated_value': estimated_value,
-                'roi_percentage': roi_percentage
-            }
-            
-        finally:
-            db.close()
+        return load_roi_data(get_data_version())
     
     def create_timeline_chart(self, timeline_df):
         """График временного ряда"""
@@ -289,6 +331,58 @@ class Dashboard:
             recent_data['datetime'] = recent_data['datetime'].dt.strftime('%d.%m.%Y %H:%M')
             st.dataframe(recent_data, hide_index=True)
     
+    def create_trend_chart(self):
+        """Долгосрочный тренд доли упоминаний"""
+        st.subheader("Долгосрочный тренд")
+        bucket_labels = {'day': 'По дням', 'week': 'По неделям', 'month': 'По месяцам'}
+        bucket = st.selectbox("Интервал", list(bucket_labels), index=1, format_func=bucket_labels.get)
+        
+        trend_df = self.get_reputation_trend(bucket)
+        if trend_df.empty:
+            st.info("Снимки репутации еще не записаны - они появляются после ежедневного обновления")
+            return
+        
+        top_products = trend_df.groupby('product')['mention_count'].sum().nlargest(6).index
+        trend_df = trend_df[trend_df['product'].isin(top_products)].copy()
+        trend_df['share_pct'] = trend_df['share'] * 100
+        
+        fig = px.line(
+            trend_df,
+            x='period',
+            y='share_pct',
+            color='product',
+            markers=True,
+            hover_data={'mention_count': True, 'avg_sentiment_score': ':.2f'},
+            labels={'period': 'Период', 'share_pct': 'Доля упоминаний, %', 'product': 'Продукт',
+                    'mention_count': 'Упоминаний', 'avg_sentiment_score': 'Тональность'}
+        )
+        fig.update_layout(
+            height=450,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='white')
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    def create_search_section(self):
+        """Поиск по текстам ответов LLM через полнотекстовый индекс"""
+        st.subheader("Поиск по ответам")
+        query = st.text_input("Слова для поиска", placeholder=f"{config.TARGET_PRODUCT} pricing")
+        if not query.strip():
+            return
+        
+        results_df = load_search_results(get_data_version(), query.strip(), 50)
+        if results_df.empty:
+            st.info("Ничего не найдено")
+            return
+        
+        st.caption(f"Найдено ответов: {len(results_df)}")
+        st.dataframe(
+            results_df.rename(columns={'id': 'ID', 'created_at': 'Дата', 'snippet': 'Фрагмент'}),
+            hide_index=True,
+            use_container_width=True
+        )
+    
     def create_product_comparison(self, product_stats):
         """Создает сравнение продуктов"""
         if not product_stats:
@@ -489,7 +583,6 @@ class Dashboard:
         
         with st.spinner("Загрузка данных..."):
             timeline_df = self.get_mentions_over_time(30)
-            product_stats = self.get_product_stats()
             roi_data = self.get_roi_data()
         
         st.subheader("Быстрые метрики")
@@ -501,8 +594,8 @@ class Dashboard:
             st.metric("Всего записей", f"{total_mentions:,}")
         
         with col2:
-            unique_products = len(product_stats)
-            st.metric("Уникальных продуктов", f"{unique_products}")
+            unique_products = timeline_df['product'].nunique() if not timeline_df.empty else 0
+            st.metric("Продуктов за 30 дней", f"{unique_products}")
         
         with col3:
             days_of_data = len(timeline_df['date'].unique()) if not timeline_df.empty else 0
@@ -512,14 +605,17 @@ class Dashboard:
             content_items = roi_data['content_items']
             st.metric("Материалов создано", f"{content_items}")
 
+        sections = {
+            "Динамика упоминаний": lambda: self.create_timeline_chart(timeline_df),
+            "Долгосрочный тренд": self.create_trend_chart,
+            "Сравнение с конкурентами": lambda: self.create_product_comparison(self.get_product_stats()),
+            "ROI": lambda: self.create_roi_section(roi_data),
+            "Поиск по ответам": self.create_search_section
+        }
+        section = st.sidebar.radio("Раздел", list(sections))
+        
         st.markdown("---")
-        self.create_timeline_chart(timeline_df)
-
-        st.markdown("---")
-        self.create_product_comparison(product_stats)
-
-        st.markdown("---")
-        self.create_roi_section(roi_data)
+        sections[section]()
 
 def main():
     """Основная функция запуска дашборда"""
@@ -0,0 +1,125 @@
+# modules/fetcher.py
+"""
+Асинхронная загрузка страниц
+Общий лимит одновременных запросов, ограничение частоты на каждый хост,
+таймауты и повторы с экспоненциальной задержкой
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import inspect
+import random
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+import httpx
+from modules.rate_limit import TokenBucket
+import config
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class AsyncFetcher:
+    def __init__(self, max_concurrency: Optional[int] = None, per_host_rate: Optional[float] = None,
+                 timeout: Optional[float] = None, retries: Optional[int] = None,
+                 backoff_base: Optional[float] = None, headers: Optional[Dict] = None):
+        self.max_concurrency = max_concurrency or config.SCRAPER_MAX_CONCURRENCY
+        self.per_host_rate = per_host_rate or config.SCRAPER_PER_HOST_RATE
+        self.timeout = timeout or config.SCRAPER_TIMEOUT
+        self.retries = config.SCRAPER_RETRIES if retries is None else retries
+        self.backoff_base = config.SCRAPER_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.headers = {'User-Agent': config.SCRAPER_USER_AGENT, **(headers or {})}
+        self.host_limiters: Dict[str, TokenBucket] = {}
+
+    def host_limiter(self, url: str) -> TokenBucket:
+        """Отдельный token bucket на хост: не больше per_host_rate запросов в минуту"""
+        host = urlsplit(url).netloc.lower()
+        if host not in self.host_limiters:
+            self.host_limiters[host] = TokenBucket(self.per_host_rate)
+        return self.host_limiters[host]
+
+    def retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Задержка перед повтором: Retry-After сервера или base * 2^attempt со случайной добавкой"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff_base * (2 ** attempt) * (1 + random.random() * 0.5)
+
+    async def fetch(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str,
+                    headers: Optional[Dict] = None) -> Dict:
+        """
+        Загружает url с повторами при сетевых ошибках и статусах 429/5xx.
+        Остальные ошибки запроса (например, цикл редиректов) возвращаются в error без повторов.
+        Возвращает словарь с url, status, content, headers, encoding, error, attempts, elapsed.
+        """
+        started = time.monotonic()
+        result = {'url': url, 'status': None, 'content': b'', 'headers': {}, 'encoding': None,
+                  'error': None, 'attempts': 0}
+
+        for attempt in range(self.retries + 1):
+            await self.host_limiter(url).acquire()
+            result['attempts'] = attempt + 1
+            response = None
+            try:
+                async with semaphore:
+                    response = await client.get(url, headers=headers)
+                result.update(status=response.status_code, content=response.content,
+                              headers=dict(response.headers), encoding=response.encoding, error=None)
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                result['error'] = f"HTTP {response.status_code}"
+            except httpx.TimeoutException:
+                result['error'] = "timeout"
+            except httpx.TransportError as e:
+                result['error'] = f"{type(e).__name__}: {e}"
+            except httpx.RequestError as e:
+                # Цикл редиректов, ошибка декодирования и т.п. - повтор даст тот же результат
+                result['error'] = f"{type(e).__name__}: {e}"
+                break
+
+            if attempt < self.retries:
+                await asyncio.sleep(self.retry_delay(attempt, response))
+
+        result['elapsed'] = round(time.monotonic() - started, 3)
+        return result
+
+    async def fetch_all(self, urls: Iterable[str],
+                        on_result: Optional[Callable[[Dict], None]] = None,
+                        headers_for: Optional[Callable[[str], Dict]] = None) -> List[Dict]:
+        """
+        Загружает все url параллельно, результаты передаются в on_result по мере готовности.
+        on_result может быть корутиной - тогда ее результат ожидается, пока остальные загрузки идут.
+        headers_for(url) возвращает дополнительные заголовки запроса (например, условные).
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limits = httpx.Limits(max_connections=self.max_concurrency,
+                              max_keepalive_connections=self.max_concurrency)
+        results = []
+
+        async with httpx.AsyncClient(headers=self.headers, timeout=self.timeout, limits=limits,
+                                     follow_redirects=True) as client:
+            tasks = [
+                asyncio.create_task(self.fetch(client, semaphore, url, headers_for(url) if headers_for else None))
+                for url in dict.fromkeys(urls)
+            ]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    result = await finished
+                    results.append(result)
+                    if on_result:
+                        outcome = on_result(result)
+                        if inspect.isawaitable(outcome):
+                            await outcome
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return results
+
+def fetch_all(urls: Iterable[str], on_result: Optional[Callable[[Dict], None]] = None, **kwargs) -> List[Dict]:
+    """Синхронная обертка над AsyncFetcher.fetch_all"""
+    return asyncio.run(AsyncFetcher(**kwargs).fetch_all(urls, on_result))
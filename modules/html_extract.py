@@ -0,0 +1,146 @@
+# modules/html_extract.py
+"""
+Извлечение текста из HTML-страниц
+Бэкенды: selectolax и lxml (если установлены), встроенный html.parser через BeautifulSoup как запасной.
+Выбор - SCRAPER_HTML_BACKEND ('auto' берет самый быстрый из установленных).
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple
+from bs4 import BeautifulSoup
+from modules.products import build_trie_pattern
+import config
+
+BOILERPLATE_TAGS = ["script", "style", "nav", "footer", "header", "aside"]
+CONTEXT_CHARS = 50
+MAX_EXAMPLES = 3
+
+def normalize_text(text: str) -> str:
+    """Убирает пустые строки и разбивает текст по двойным пробелам"""
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+def extract_with_html_parser(content: bytes) -> Dict:
+    soup = BeautifulSoup(content, 'html.parser')
+
+    title = soup.title.string if soup.title else ""
+
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+
+    main_content = soup.find('main') or soup.find('article') or soup.find('div', {'class': 'content'}) or soup
+    text = main_content.get_text(separator=' ', strip=True)
+
+    meta_desc = soup.find("meta", {"name": "description"}) or soup.find("meta", {"property": "og:description"})
+    description = meta_desc.get("content", "") if meta_desc else ""
+
+    return {'title': title or "", 'description': description, 'text': normalize_text(text)}
+
+def extract_with_lxml(content: bytes) -> Dict:
+    import lxml.html
+
+    if not content.strip():
+        return {'title': "", 'description': "", 'text': ""}
+    root = lxml.html.fromstring(content)
+
+    title = root.findtext('.//title') or ""
+
+    meta = root.xpath('//meta[@name="description"]/@content') or root.xpath('//meta[@property="og:description"]/@content')
+    description = meta[0] if meta else ""
+
+    for tag in root.xpath('//' + ' | //'.join(BOILERPLATE_TAGS)):
+        tag.drop_tree()
+
+    main_content = root.xpath('(//main | //article | //div[@class="content"])[1]')
+    node = main_content[0] if main_content else root
+    strings = (string.strip() for string in node.itertext())
+    text = ' '.join(string for string in strings if string)
+
+    return {'title': title, 'description': description, 'text': normalize_text(text)}
+
+def extract_with_selectolax(content: bytes) -> Dict:
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(content)
+
+    title_node = tree.css_first('title')
+    title = title_node.text() if title_node else ""
+
+    meta = tree.css_first('meta[name="description"]') or tree.css_first('meta[property="og:description"]')
+    description = (meta.attributes.get('content') or "") if meta else ""
+
+    tree.strip_tags(BOILERPLATE_TAGS)
+
+    node = tree.css_first('main') or tree.css_first('article') or tree.css_first('div.content') or tree.root
+    text = node.text(separator=' ', strip=True) if node else ""
+
+    return {'title': title, 'description': description, 'text': normalize_text(text)}
+
+BACKENDS: Dict[str, Tuple[str, Callable[[bytes], Dict]]] = {
+    'selectolax': ('selectolax.lexbor', extract_with_selectolax),
+    'lxml': ('lxml.html', extract_with_lxml),
+    'html.parser': ('bs4', extract_with_html_parser),
+}
+
+def available_backends() -> List[str]:
+    """Установленные бэкенды в порядке предпочтения"""
+    available = []
+    for name, (module_name, _) in BACKENDS.items():
+        try:
+            __import__(module_name)
+            available.append(name)
+        except ImportError:
+            continue
+    return available
+
+@lru_cache(maxsize=None)
+def get_backend(name: str = None) -> Callable[[bytes], Dict]:
+    """Функция извлечения для бэкенда name; 'auto' - первый установленный"""
+    name = name or config.SCRAPER_HTML_BACKEND
+    available = available_backends()
+
+    if name == 'auto':
+        return BACKENDS[available[0]][1]
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд HTML: {name}, допустимые: auto, {', '.join(BACKENDS)}")
+    if name not in available:
+        print(f"Бэкенд HTML {name} не установлен, использую {available[0]}")
+        return BACKENDS[available[0]][1]
+    return BACKENDS[name][1]
+
+class ProductMatcher:
+    """Находит все продукты за один проход по тексту, без учета регистра"""
+
+    def __init__(self, products: Tuple[str, ...]):
+        self.names = {}
+        for product in products:
+            self.names.setdefault(product.lower(), product)
+        self.pattern = re.compile(build_trie_pattern(sorted(self.names)), re.IGNORECASE)
+
+    def find(self, text: str) -> Dict[str, Dict]:
+        """{продукт: {'count', 'examples'}}, пример - до 50 символов контекста с каждой стороны в пределах строки"""
+        mentions = {}
+        for match in self.pattern.finditer(text):
+            product = self.names[match.group(0).lower()]
+            found = mentions.setdefault(product, {'count': 0, 'examples': []})
+            found['count'] += 1
+
+            if len(found['examples']) < MAX_EXAMPLES:
+                line_start = text.rfind('\n', 0, match.start()) + 1
+                line_end = text.find('\n', match.end())
+                line_end = len(text) if line_end == -1 else line_end
+                found['examples'].append(text[
+                    max(line_start, match.start() - CONTEXT_CHARS):min(line_end, match.end() + CONTEXT_CHARS)
+                ])
+        return mentions
+
+@lru_cache(maxsize=8)
+def get_product_matcher(products: Tuple[str, ...]) -> ProductMatcher:
+    return ProductMatcher(products)
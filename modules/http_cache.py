@@ -0,0 +1,154 @@
+# modules/http_cache.py
+"""
+Кэш страниц для условных GET-запросов
+Хранит ETag / Last-Modified и разобранный результат страницы; при ответе 304 результат берется из кэша.
+Общий размер ограничен HTTP_CACHE_MAX_BYTES, вытесняются давно не использованные записи.
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import json
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal, HTTPCacheEntry
+import config
+
+stats = {'revalidated': 0, 'modified': 0, 'uncached': 0, 'stores': 0, 'evicted': 0}
+
+def get_entries(urls: Iterable[str]) -> Dict[str, Dict]:
+    """Сохраненные валидаторы и результаты для списка url одним запросом"""
+    urls = list(urls)
+    if not urls:
+        return {}
+
+    db = SessionLocal()
+    try:
+        rows = db.query(HTTPCacheEntry).filter(HTTPCacheEntry.url.in_(urls))
+        return {
+            entry.url: {
+                'etag': entry.etag,
+                'last_modified': entry.last_modified,
+                'data': json.loads(entry.parsed_data)
+            }
+            for entry in rows
+        }
+    except Exception as e:
+        print(f"Ошибка чтения HTTP-кэша: {e}")
+        return {}
+    finally:
+        db.close()
+
+def get_entry(url: str) -> Optional[Dict]:
+    return get_entries([url]).get(url)
+
+def conditional_headers(entry: Optional[Dict]) -> Dict:
+    """Заголовки If-None-Match / If-Modified-Since для сохраненной записи"""
+    headers = {}
+    if entry:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def mark_not_modified(url: str):
+    """Отмечает успешную ревалидацию (ответ 304)"""
+    db = SessionLocal()
+    try:
+        db.query(HTTPCacheEntry).filter_by(url=url).update({
+            HTTPCacheEntry.hit_count: func.coalesce(HTTPCacheEntry.hit_count, 0) + 1,
+            HTTPCacheEntry.last_accessed_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+        stats['revalidated'] += 1
+    except Exception as e:
+        print(f"Ошибка записи в HTTP-кэш: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def put(url: str, response_headers: Dict, data: Dict):
+    """
+    Сохраняет разобранную страницу вместе с валидаторами ответа.
+    Страницы без ETag и Last-Modified не кэшируются - их нельзя проверить условным запросом.
+    """
+    headers = {key.lower(): value for key, value in response_headers.items()}
+    etag = headers.get('etag')
+    last_modified = headers.get('last-modified')
+
+    if not etag and not last_modified:
+        stats['uncached'] += 1
+        return
+
+    stats['modified'] += 1
+    parsed_data = json.dumps(data, ensure_ascii=False)
+    db = SessionLocal()
+
+    try:
+        now = datetime.utcnow()
+        entry = db.query(HTTPCacheEntry).filter_by(url=url).first()
+
+        if entry is None:
+            entry = HTTPCacheEntry(url=url)
+            db.add(entry)
+        entry.etag = etag
+        entry.last_modified = last_modified
+        entry.parsed_data = parsed_data
+        entry.size_bytes = len(parsed_data.encode('utf-8'))
+        entry.fetched_at = now
+        entry.last_accessed_at = now
+        db.commit()
+        stats['stores'] += 1
+
+        evict(db)
+
+    except IntegrityError:
+        db.rollback()
+    except Exception as e:
+        print(f"Ошибка записи в HTTP-кэш: {e}")
+        db.rollback()
+
+    finally:
+        db.close()
+
+def evict(db, max_bytes: Optional[int] = None):
+    """Удаляет давно не использованные записи, пока общий размер больше max_bytes"""
+    max_bytes = config.HTTP_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    overflow = (db.query(func.sum(HTTPCacheEntry.size_bytes)).scalar() or 0) - max_bytes
+
+    if overflow <= 0:
+        return
+
+    stale_ids = []
+    for entry_id, size_bytes in db.query(HTTPCacheEntry.id, HTTPCacheEntry.size_bytes).order_by(
+        HTTPCacheEntry.last_accessed_at.asc()
+    ):
+        if overflow <= 0:
+            break
+        stale_ids.append(entry_id)
+        overflow -= size_bytes or 0
+
+    db.query(HTTPCacheEntry).filter(HTTPCacheEntry.id.in_(stale_ids)).delete(synchronize_session=False)
+    db.commit()
+    stats['evicted'] += len(stale_ids)
+
+def clear():
+    """Полностью очищает кэш"""
+    db = SessionLocal()
+    try:
+        deleted = db.query(HTTPCacheEntry).delete()
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+def format_stats() -> str:
+    return (
+        f"HTTP cache not modified/modified: {stats['revalidated']}/{stats['modified']}, "
+        f"without validators: {stats['uncached']}, evicted: {stats['evicted']}"
+    )
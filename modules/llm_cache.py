@@ -0,0 +1,150 @@
+# modules/llm_cache.py
+"""
+Постоянный кэш ответов LLM
+Ключ - хэш (модель, промпт, temperature, max_tokens, top_p), TTL и LRU-вытеснение
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal, LLMCacheEntry
+import config
+
+stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evicted': 0}
+# get/put вызываются из нескольких потоков (asyncio.to_thread)
+_stats_lock = threading.Lock()
+
+def _count(name: str, amount: int = 1):
+    with _stats_lock:
+        stats[name] += amount
+
+def make_key(model: str, prompt: str, temperature=None, max_tokens=None, top_p=None) -> str:
+    """Строит ключ кэша по содержимому запроса"""
+    payload = json.dumps({
+        'model': model,
+        'prompt': prompt,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+        'top_p': top_p
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def is_enabled(use_cache: bool = True) -> bool:
+    """Кэш используется, если он не отключен вызовом или LLM_CACHE_BYPASS"""
+    return use_cache and not config.LLM_CACHE_BYPASS
+
+def get(cache_key: str) -> Optional[str]:
+    """Возвращает сохраненный ответ или None, если его нет или истек TTL"""
+    db = SessionLocal()
+
+    try:
+        entry = db.query(LLMCacheEntry).filter_by(cache_key=cache_key).first()
+
+        if entry is None:
+            _count('misses')
+            return None
+
+        now = datetime.utcnow()
+        if entry.created_at < now - timedelta(hours=config.LLM_CACHE_TTL_HOURS):
+            db.delete(entry)
+            db.commit()
+            _count('misses')
+            return None
+
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_accessed_at = now
+        response_text = entry.response_text
+        db.commit()
+
+        _count('hits')
+        return response_text
+
+    except Exception as e:
+        print(f"Ошибка чтения кэша LLM: {e}")
+        db.rollback()
+        return None
+
+    finally:
+        db.close()
+
+def put(cache_key: str, model: str, response_text: str):
+    """Сохраняет ответ и вытесняет давно не использованные записи сверх лимита"""
+    if not response_text:
+        return
+
+    db = SessionLocal()
+
+    try:
+        now = datetime.utcnow()
+        entry = db.query(LLMCacheEntry).filter_by(cache_key=cache_key).first()
+
+        if entry:
+            entry.response_text = response_text
+            entry.created_at = now
+            entry.last_accessed_at = now
+        else:
+            db.add(LLMCacheEntry(
+                cache_key=cache_key,
+                llm_model=model,
+                response_text=response_text,
+                created_at=now,
+                last_accessed_at=now
+            ))
+        db.commit()
+        _count('stores')
+
+        evict(db)
+
+    except IntegrityError:
+        db.rollback()
+    except Exception as e:
+        print(f"Ошибка записи в кэш LLM: {e}")
+        db.rollback()
+
+    finally:
+        db.close()
+
+def evict(db, max_entries: Optional[int] = None):
+    """Удаляет записи сверх max_entries, начиная с давно не использованных"""
+    max_entries = config.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    overflow = db.query(LLMCacheEntry).count() - max_entries
+
+    if overflow <= 0:
+        return
+
+    stale_ids = [row.id for row in db.query(LLMCacheEntry.id).order_by(
+        LLMCacheEntry.last_accessed_at.asc()
+    ).limit(overflow)]
+
+    db.query(LLMCacheEntry).filter(LLMCacheEntry.id.in_(stale_ids)).delete(synchronize_session=False)
+    db.commit()
+    _count('evicted', len(stale_ids))
+
+def clear():
+    """Полностью очищает кэш"""
+    db = SessionLocal()
+    try:
+        deleted = db.query(LLMCacheEntry).delete()
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+def get_stats() -> Dict:
+    with _stats_lock:
+        return dict(stats)
+
+def format_stats() -> str:
+    summary = get_stats()
+    return (
+        f"LLM cache hits/misses: {summary['hits']}/{summary['misses']}, "
+        f"stored: {summary['stores']}, evicted: {summary['evicted']}"
+    )
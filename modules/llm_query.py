@@ -6,7 +6,12 @@ sys.path.insert(0, parent_dir)
 from database import SessionLocal, LLMQuery, LLMResponse
 import config
 import time
-from mistralai import Mistral
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from modules import mistral_client
+from modules import llm_cache
+from modules import run_manifest
+from modules.rate_limit import TokenBucket
 
 def create_prompt_for_query(user_query: str) -> str:
     """Создает оптимизированный промпт для анализатора рынка"""
@@ -31,114 +36,195 @@ Provide a detailed, objective analysis:"""
     
     return prompt_template.format(query=user_query)
 
-def query_mistral(prompt: str, model: str = config.MISTRAL_MODEL) -> str:
-    """Sends request to Mistral AI (for version 1.x.x)"""
-    try:
-        client = Mistral(api_key=config.MISTRAL_API_KEY)
-        
-        chat_response = client.chat.complete(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=2000,
-            top_p=0.9
-        )
-        
-        answer = chat_response.choices[0].message.content
-        answer = answer.replace("*", "").replace("#", "").strip()
+QUERY_PARAMS = {
+    'temperature': 0.7,
+    'max_tokens': 2000,
+    'top_p': 0.9
+}
 
-        if hasattr(chat_response, 'usage'):
-            print(f"Tokens used: {chat_response.usage.total_tokens}")
-            
-        return answer
+def query_mistral(prompt: str, model: str = config.MISTRAL_MODEL, use_cache: bool = True) -> str:
+    """Sends request to Mistral AI (for version 1.x.x), reusing cached answers when allowed"""
+    cache_key = llm_cache.make_key(model, prompt, **QUERY_PARAMS)
+    
+    if llm_cache.is_enabled(use_cache):
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return clean_answer(cached)
+    
+    try:
+        chat_response = mistral_client.chat_complete(prompt, model=model, **QUERY_PARAMS)
+        answer = extract_answer(chat_response)
+        llm_cache.put(cache_key, model, answer)
+        return clean_answer(answer)
             
     except Exception as e:
         print(f"Error querying Mistral AI: {e}")
         return ""
 
-def process_single_query(query_text: str, query_index: int, total_queries: int) -> bool:
-    """Processes a single query and saves results to database"""
-    db = SessionLocal()
-    success = False
+async def query_mistral_async(prompt: str, model: str = config.MISTRAL_MODEL, use_cache: bool = True,
+                              limiter: Optional[TokenBucket] = None) -> str:
+    """
+    Sends request to Mistral AI without blocking the event loop; cache hits skip the rate limiter.
+    Cache reads and writes are SQLite commits, so they run in a worker thread.
+    """
+    cache_key = llm_cache.make_key(model, prompt, **QUERY_PARAMS)
+    
+    if llm_cache.is_enabled(use_cache):
+        cached = await asyncio.to_thread(llm_cache.get, cache_key)
+        if cached is not None:
+            return clean_answer(cached)
     
     try:
-        full_prompt = create_prompt_for_query(query_text)
+        if limiter:
+            await limiter.acquire()
         
-        print(f"[{query_index}/{total_queries}] Processing query: {query_text[:80]}...")
+        chat_response = await mistral_client.chat_complete_async(prompt, model=model, **QUERY_PARAMS)
+        answer = extract_answer(chat_response)
+        await asyncio.to_thread(llm_cache.put, cache_key, model, answer)
+        return clean_answer(answer)
+            
+    except Exception as e:
+        print(f"Error querying Mistral AI: {e}")
+        return ""
+
+def extract_answer(chat_response) -> str:
+    """Extracts raw answer text from Mistral chat response"""
+    if hasattr(chat_response, 'usage'):
+        print(f"Tokens used: {chat_response.usage.total_tokens}")
+    
+    return chat_response.choices[0].message.content or ""
+
+def clean_answer(answer: str) -> str:
+    """Removes markdown symbols from answer"""
+    return answer.replace("*", "").replace("#", "").strip()
 
+ANALYSIS_RUN_TYPE = 'analysis_queries'
+
+def save_query_result(query_text: str, response_text: str, manifest_item_id: Optional[int] = None) -> bool:
+    """
+    Saves query and its response to database, returns True for non-empty response.
+    The run manifest item is updated in the same transaction.
+    """
+    db = SessionLocal()
+    
+    try:
         query_record = LLMQuery(
             query_text=query_text,
-            llm_model=config.MISTRAL_MODEL
+            llm_model=config.MISTRAL_MODEL,
+            source='analysis'
         )
         db.add(query_record)
+        db.flush()
+        
+        response_record = LLMResponse(
+            query_id=query_record.id,
+            response_text=response_text
+        )
+        db.add(response_record)
+        db.flush()
+        
+        run_manifest.mark_item(db, manifest_item_id, 'done' if response_text else 'failed', response_record.id)
         db.commit()
-        db.refresh(query_record)
-
-        response_text = query_mistral(full_prompt)
         
-        if response_text:
-            response_record = LLMResponse(
-                query_id=query_record.id,
-                response_text=response_text,
-                full_raw_response=response_text
-            )
-            db.add(response_record)
-            db.commit()
-            
-            word_count = len(response_text.split())
-            print(f"Response saved ({len(response_text)} chars, {word_count} words)")
-            success = True
-        else:
-            print(f"Empty response from Mistral AI")
-            response_record = LLMResponse(
-                query_id=query_record.id,
-                response_text="",
-                full_raw_response=""
-            )
-            db.add(response_record)
-            db.commit()
-            
     except Exception as e:
-        print(f"Error processing query: {e}")
+        print(f"Error saving query result: {e}")
         db.rollback()
+        return False
         
     finally:
         db.close()
+    
+    if response_text:
+        word_count = len(response_text.split())
+        print(f"Response saved ({len(response_text)} chars, {word_count} words)")
+        return True
+    
+    print(f"Empty response from Mistral AI")
+    return False
+
+def process_single_query(query_text: str, query_index: int, total_queries: int) -> bool:
+    """Processes a single query and saves results to database"""
+    try:
+        full_prompt = create_prompt_for_query(query_text)
+        
+        print(f"[{query_index}/{total_queries}] Processing query: {query_text[:80]}...")
+
+        response_text = query_mistral(full_prompt)
+        return save_query_result(query_text, response_text)
+            
+    except Exception as e:
+        print(f"Error processing query: {e}")
+        return False
+
+async def run_queries_async(items: List[Tuple[Optional[int], int, str]], total_queries: int, progress: Dict,
+                            model: str = config.MISTRAL_MODEL, use_cache: bool = True):
+    """
+    Runs queries concurrently: at most MISTRAL_MAX_CONCURRENCY requests in flight,
+    request rate is limited by MISTRAL_RATE_LIMIT. Results are saved as they arrive.
+    items are (manifest_item_id, query_index, query_text) tuples.
+    """
+    bucket = TokenBucket(config.MISTRAL_RATE_LIMIT, config.MISTRAL_RATE_BURST)
+    semaphore = asyncio.Semaphore(config.MISTRAL_MAX_CONCURRENCY)
+    
+    async def worker(item_id: Optional[int], query_index: int, query_text: str) -> bool:
+        async with semaphore:
+            print(f"[{query_index}/{total_queries}] Processing query: {query_text[:80]}...")
+            response_text = await query_mistral_async(create_prompt_for_query(query_text), model,
+                                                      use_cache=use_cache, limiter=bucket)
         
-    return success
+        return await asyncio.to_thread(save_query_result, query_text, response_text, item_id)
+    
+    tasks = [asyncio.create_task(worker(*item)) for item in items]
+    
+    try:
+        for finished in asyncio.as_completed(tasks):
+            try:
+                if await finished:
+                    progress['successful'] += 1
+            except Exception as e:
+                print(f"Unexpected error in query worker: {e}")
+            progress['completed'] += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+        await mistral_client.close_async_client()
 
-def run_analysis_queries():
-    """Runs all queries from config and saves results to database"""
-    total_queries = len(config.SAMPLE_QUERIES)
-    successful_queries = 0
+def run_analysis_queries(queries: Optional[List[str]] = None, use_cache: bool = True):
+    """
+    Runs all queries from config and saves results to database.
+    An interrupted run is resumed: only queries without a saved response are sent again.
+    """
+    if queries is None:
+        queries = config.SAMPLE_QUERIES
+    
+    total_queries = len(queries)
+    progress = {'completed': 0, 'successful': 0}
+    session_id, pending = run_manifest.start_or_resume_run(ANALYSIS_RUN_TYPE, queries)
     
     print(f"Starting market analysis with {total_queries} queries")
+    if len(pending) < total_queries:
+        print(f"Resuming run {session_id}: {total_queries - len(pending)} queries already done, {len(pending)} left")
     print(f"Using model: {config.MISTRAL_MODEL}")
+    print(f"Concurrency: {config.MISTRAL_MAX_CONCURRENCY}, rate limit: {config.MISTRAL_RATE_LIMIT} req/min")
     
-    for idx, query_text in enumerate(config.SAMPLE_QUERIES, 1):
-        try:
-            success = process_single_query(query_text, idx, total_queries)
-            if success:
-                successful_queries += 1
-
-            if idx < total_queries:
-                delay_time = 60.0 / config.MISTRAL_RATE_LIMIT
-                time.sleep(delay_time)
-                
-        except KeyboardInterrupt:
-            print("Analysis interrupted by user")
-            break
-        except Exception as e:
-            print(f"Unexpected error in main loop: {e}")
-            continue
+    try:
+        asyncio.run(run_queries_async(pending, total_queries, progress, use_cache=use_cache))
+        run_manifest.finish_run(session_id)
+    except KeyboardInterrupt:
+        print(f"Analysis interrupted by user, run {session_id} will be resumed next time")
+    
+    successful_queries = progress['successful'] + (total_queries - len(pending))
 
     print(f"\n{'='*60}")
     print("ANALYSIS COMPLETED")
     print(f"{'='*60}")
     print(f"Total queries: {total_queries}")
+    print(f"Completed: {progress['completed']}")
     print(f"Successful: {successful_queries}")
-    print(f"Success rate: {(successful_queries/total_queries)*100:.1f}%")
+    print(f"Success rate: {(successful_queries/total_queries)*100:.1f}%" if total_queries else "Success rate: N/A")
     print(f"Results saved to database")
+    print(mistral_client.format_stats())
+    print(llm_cache.format_stats())
     print(f"{'='*60}")
     
     if successful_queries == 0:
@@ -150,12 +236,10 @@ def test_mistral_connection():
     print("Testing Mistral AI connection...")
     
     try:
-        client = Mistral(api_key=config.MISTRAL_API_KEY)
-
         test_prompt = "Hello, please respond with 'Connection successful'."
-        response = client.chat.complete(
+        response = mistral_client.chat_complete(
+            test_prompt,
             model=config.MISTRAL_MODEL,
-            messages=[{"role": "user", "content": test_prompt}],
             max_tokens=10
         )
         
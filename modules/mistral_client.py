@@ -0,0 +1,212 @@
+# modules/mistral_client.py
+"""
+Общий клиент Mistral AI с пулом соединений и keep-alive
+Ведет статистику задержек и повторного использования соединений
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from mistralai import Mistral
+import config
+
+NEW_CONNECTION_FLAG = "ai_pr_new_connection"
+
+class ClientStats:
+    """Статистика вызовов: задержки, ошибки, новые и переиспользованные соединения"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.errors = 0
+            self.latencies: List[float] = []
+            self.new_connections = 0
+            self.reused_connections = 0
+
+    def record_call(self, latency: float, success: bool):
+        with self.lock:
+            self.calls += 1
+            self.latencies.append(latency)
+            if not success:
+                self.errors += 1
+
+    def record_connection(self, is_new: bool):
+        with self.lock:
+            if is_new:
+                self.new_connections += 1
+            else:
+                self.reused_connections += 1
+
+    def summary(self) -> Dict:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            requests_sent = self.new_connections + self.reused_connections
+
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'avg_latency': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                'p95_latency': round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else 0.0,
+                'max_latency': round(latencies[-1], 3) if latencies else 0.0,
+                'new_connections': self.new_connections,
+                'reused_connections': self.reused_connections,
+                'reuse_rate': round(self.reused_connections / requests_sent * 100, 1) if requests_sent else 0.0
+            }
+
+stats = ClientStats()
+
+def _mark_new_connection(request: httpx.Request, event_name: str):
+    if event_name == "connection.connect_tcp.complete":
+        request.extensions[NEW_CONNECTION_FLAG] = True
+
+def _on_request(request: httpx.Request):
+    def trace(event_name, info):
+        _mark_new_connection(request, event_name)
+    request.extensions["trace"] = trace
+
+def _on_response(response: httpx.Response):
+    stats.record_connection(response.request.extensions.get(NEW_CONNECTION_FLAG, False))
+
+async def _on_request_async(request: httpx.Request):
+    async def trace(event_name, info):
+        _mark_new_connection(request, event_name)
+    request.extensions["trace"] = trace
+
+async def _on_response_async(response: httpx.Response):
+    _on_response(response)
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.MISTRAL_POOL_SIZE,
+        max_keepalive_connections=config.MISTRAL_POOL_SIZE,
+        keepalive_expiry=config.MISTRAL_KEEPALIVE_EXPIRY
+    )
+
+_client: Optional[Mistral] = None
+_client_lock = threading.RLock()
+_async_clients: Dict[int, Tuple[asyncio.AbstractEventLoop, Mistral]] = {}
+
+def get_client() -> Mistral:
+    """Возвращает общий синхронный клиент (создается один раз на процесс)"""
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            http_client = httpx.Client(
+                limits=_pool_limits(),
+                timeout=config.MISTRAL_TIMEOUT,
+                event_hooks={'request': [_on_request], 'response': [_on_response]}
+            )
+            _client = Mistral(api_key=config.MISTRAL_API_KEY, client=http_client)
+        return _client
+
+def get_async_client() -> Mistral:
+    """
+    Возвращает общий асинхронный клиент для текущего event loop.
+    Пул httpx.AsyncClient привязан к циклу, поэтому на каждый цикл свой клиент;
+    в конце цикла его закрывает close_async_client.
+    """
+    loop = asyncio.get_running_loop()
+    key = id(loop)
+
+    with _client_lock:
+        entry = _async_clients.get(key)
+        if entry is None:
+            for stale_loop, stale_client in _async_clients.values():
+                # Клиент цикла, который еще работает в другом потоке, закрывается в своем цикле
+                if not stale_loop.is_closed():
+                    asyncio.run_coroutine_threadsafe(stale_client.sdk_configuration.async_client.aclose(), stale_loop)
+            _async_clients.clear()
+            http_client = httpx.AsyncClient(
+                limits=_pool_limits(),
+                timeout=config.MISTRAL_TIMEOUT,
+                event_hooks={'request': [_on_request_async], 'response': [_on_response_async]}
+            )
+            client = Mistral(api_key=config.MISTRAL_API_KEY, client=get_client().sdk_configuration.client,
+                             async_client=http_client)
+            entry = _async_clients[key] = (loop, client)
+        return entry[1]
+
+async def close_async_client():
+    """Закрывает пул соединений асинхронного клиента текущего цикла (в finally точки входа asyncio.run)"""
+    with _client_lock:
+        entry = _async_clients.pop(id(asyncio.get_running_loop()), None)
+    if entry is not None:
+        await entry[1].sdk_configuration.async_client.aclose()
+
+def chat_complete(prompt: str, model: str = config.MISTRAL_MODEL, **params):
+    """Синхронный запрос к chat completion через общий клиент"""
+    started = time.perf_counter()
+    success = False
+
+    try:
+        response = get_client().chat.complete(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            **params
+        )
+        success = True
+        return response
+    finally:
+        stats.record_call(time.perf_counter() - started, success)
+
+async def chat_complete_async(prompt: str, model: str = config.MISTRAL_MODEL, **params):
+    """Асинхронный запрос к chat completion через общий клиент"""
+    started = time.perf_counter()
+    success = False
+
+    try:
+        response = await get_async_client().chat.complete_async(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            **params
+        )
+        success = True
+        return response
+    finally:
+        stats.record_call(time.perf_counter() - started, success)
+
+async def chat_stream_async(prompt: str, model: str = config.MISTRAL_MODEL, **params) -> AsyncIterator[str]:
+    """Асинхронный потоковый запрос: отдает фрагменты текста по мере генерации"""
+    started = time.perf_counter()
+    success = False
+
+    try:
+        events = await get_async_client().chat.stream_async(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            **params
+        )
+        async with events:
+            async for event in events:
+                delta = event.data.choices[0].delta.content if event.data.choices else None
+                if isinstance(delta, str) and delta:
+                    yield delta
+        success = True
+    finally:
+        stats.record_call(time.perf_counter() - started, success)
+
+def get_stats() -> Dict:
+    """Возвращает сводку по вызовам и соединениям"""
+    return stats.summary()
+
+def format_stats() -> str:
+    """Форматирует статистику клиента для вывода в консоль или лог"""
+    summary = get_stats()
+    return (
+        f"Mistral calls: {summary['calls']} (errors: {summary['errors']}), "
+        f"latency avg/p95/max: {summary['avg_latency']}/{summary['p95_latency']}/{summary['max_latency']}s, "
+        f"connections new/reused: {summary['new_connections']}/{summary['reused_connections']} "
+        f"(reuse {summary['reuse_rate']}%)"
+    )
@@ -0,0 +1,130 @@
+# modules/page_store.py
+"""
+Хранилище полных текстов собранных страниц
+Тексты сжимаются zlib и хранятся один раз на хэш содержимого (page_blobs),
+каждая загрузка страницы - запись (url, хэш, время) в page_snapshots.
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import hashlib
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import PageBlob, PageSnapshot
+import config
+
+def source_to_url(source_name: str) -> Optional[str]:
+    """URL страницы источника или None, если имя не похоже на домен"""
+    if '.' not in source_name or ' ' in source_name:
+        return None
+    if not source_name.startswith(('http://', 'https://')):
+        return f'https://{source_name}'
+    return source_name
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def store_blob(db, text: str) -> str:
+    """Сохраняет текст, если такого содержимого еще нет; возвращает хэш"""
+    digest = content_hash(text)
+    raw = text.encode('utf-8')
+    compressed = zlib.compress(raw, config.PAGE_STORE_COMPRESSION_LEVEL)
+
+    db.execute(sqlite_insert(PageBlob.__table__).values(
+        content_hash=digest,
+        compressed_text=compressed,
+        raw_size=len(raw),
+        stored_size=len(compressed),
+        created_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['content_hash']))
+    return digest
+
+def record_snapshot(db, url: str, digest: str, title: Optional[str] = None,
+                    fetched_at: Optional[datetime] = None):
+    """Отмечает загрузку url с содержимым digest (текст уже сохранен)"""
+    db.add(PageSnapshot(
+        url=url,
+        content_hash=digest,
+        title=(title or '')[:200],
+        fetched_at=fetched_at or datetime.utcnow()
+    ))
+
+def save_page(db, url: str, text: str, title: Optional[str] = None,
+              fetched_at: Optional[datetime] = None) -> str:
+    """Сохраняет текст страницы и запись о загрузке. Коммит делает вызывающий код."""
+    digest = store_blob(db, text)
+    record_snapshot(db, url, digest, title, fetched_at)
+    return digest
+
+def decompress(compressed_text: bytes) -> str:
+    return zlib.decompress(compressed_text).decode('utf-8')
+
+def _latest_snapshots(db, urls: Optional[Iterable[str]] = None):
+    """Подзапрос: время последней загрузки для каждого url"""
+    latest = db.query(
+        PageSnapshot.url,
+        func.max(PageSnapshot.fetched_at).label('fetched_at')
+    )
+    if urls is not None:
+        latest = latest.filter(PageSnapshot.url.in_(list(urls)))
+    return latest.group_by(PageSnapshot.url).subquery()
+
+def iter_latest_pages(db, urls: Optional[Iterable[str]] = None,
+                      batch_size: int = 100) -> Iterator[Tuple[str, datetime, str, str]]:
+    """
+    Последняя сохраненная версия каждой страницы: (url, fetched_at, title, text).
+    Строки читаются пачками, текст распаковывается по одному - в памяти не держится весь корпус.
+    """
+    latest = _latest_snapshots(db, urls)
+    rows = db.query(
+        PageSnapshot.url,
+        PageSnapshot.fetched_at,
+        PageSnapshot.title,
+        PageBlob.compressed_text
+    ).join(
+        latest, (PageSnapshot.url == latest.c.url) & (PageSnapshot.fetched_at == latest.c.fetched_at)
+    ).join(
+        PageBlob, PageBlob.content_hash == PageSnapshot.content_hash
+    ).order_by(PageSnapshot.url).yield_per(batch_size)
+
+    seen = set()
+    for url, fetched_at, title, compressed_text in rows:
+        if url in seen:
+            continue
+        seen.add(url)
+        yield url, fetched_at, title, decompress(compressed_text)
+
+def get_latest_text(db, url: str) -> Optional[str]:
+    for _, _, _, text in iter_latest_pages(db, [url]):
+        return text
+    return None
+
+def iter_history(db, url: str) -> Iterator[Tuple[datetime, str]]:
+    """Все загрузки url по времени: (fetched_at, хэш содержимого)"""
+    rows = db.query(PageSnapshot.fetched_at, PageSnapshot.content_hash).filter(
+        PageSnapshot.url == url
+    ).order_by(PageSnapshot.fetched_at)
+    for fetched_at, digest in rows:
+        yield fetched_at, digest
+
+def get_stats(db) -> Dict:
+    blobs, raw_size, stored_size = db.query(
+        func.count(PageBlob.id),
+        func.coalesce(func.sum(PageBlob.raw_size), 0),
+        func.coalesce(func.sum(PageBlob.stored_size), 0)
+    ).one()
+    snapshots, urls = db.query(func.count(PageSnapshot.id), func.count(func.distinct(PageSnapshot.url))).one()
+    return {
+        'urls': urls,
+        'snapshots': snapshots,
+        'unique_pages': blobs,
+        'raw_bytes': raw_size,
+        'stored_bytes': stored_size,
+        'compression_ratio': round(raw_size / stored_size, 2) if stored_size else 0.0
+    }
@@ -0,0 +1,76 @@
+# modules/products.py
+"""
+Нормализация названий продуктов
+Упоминания хранятся под нормализованным именем, поэтому поиск по продукту - точное сравнение
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import re
+from typing import Dict, List
+from database import ProductMention
+
+PRODUCT_ALIASES = {
+    'n8n': ['n8n', 'n8n.io', 'n8n cloud', 'n8n.io cloud'],
+    'zapier': ['zapier'],
+    'make': ['make', 'make.com'],
+    'integromat': ['integromat'],
+    'microsoft power automate': ['microsoft power automate', 'power automate'],
+    'ifttt': ['ifttt']
+}
+
+def normalize_product_name_fixed(name: str) -> str:
+    """Исправленная нормализация имен продуктов"""
+    name_lower = name.lower().strip()
+
+    for normalized, variants in PRODUCT_ALIASES.items():
+        if name_lower == normalized:
+            return normalized
+        if name_lower in variants:
+            return normalized
+    
+    return name_lower
+
+def build_trie_pattern(words: List[str]) -> str:
+    """
+    Строит регулярное выражение в виде префиксного дерева.
+    Стоимость проверки позиции зависит от длины общего префикса, а не от числа слов.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def to_pattern(node: Dict) -> str:
+        is_end = '' in node
+        branches = [re.escape(char) + to_pattern(child) for char, child in sorted(node.items()) if char]
+
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if is_end:
+            return '(?:' + body + ')?'
+        return body
+
+    return to_pattern(trie)
+
+def product_filter(product: str):
+    """Условие для запроса упоминаний продукта (использует индекс по product_name)"""
+    return ProductMention.product_name == normalize_product_name_fixed(product)
+
+def normalize_stored_product_names(db) -> int:
+    """Приводит уже сохраненные имена продуктов к нормализованному виду"""
+    updated = 0
+    for (name,) in db.query(ProductMention.product_name).distinct():
+        normalized = normalize_product_name_fixed(name)
+        if normalized != name:
+            updated += db.query(ProductMention).filter(ProductMention.product_name == name).update(
+                {ProductMention.product_name: normalized}, synchronize_session=False
+            )
+    db.commit()
+    return updated
@@ -0,0 +1,30 @@
+# modules/rate_limit.py
+"""
+Ограничение частоты запросов для asyncio-кода
+"""
+import asyncio
+import time
+
+class TokenBucket:
+    """Token bucket rate limiter: rate_per_minute tokens, at most capacity in a burst"""
+    
+    def __init__(self, rate_per_minute: float, capacity: int = 1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Waits until a token is available and takes it"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self.tokens) / self.rate)
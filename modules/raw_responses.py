@@ -0,0 +1,83 @@
+# modules/raw_responses.py
+"""
+Перенос исходных ответов LLM в сжатое хранилище
+Раньше каждый ответ хранился дважды: response_text и такая же копия в full_raw_response.
+Миграция удаляет совпадающие копии, отличающиеся сжимает в raw_response_compressed
+и выполняет VACUUM, чтобы освободившееся место вернулось из файла базы.
+Чтение - через свойство LLMResponse.raw_response.
+
+Запуск: python modules/raw_responses.py [--no-vacuum]
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import time
+import zlib
+from typing import Dict
+from sqlalchemy import bindparam, text
+from database import SessionLocal, LLMResponse, engine
+from modules.response_stream import iter_response_batches
+import config
+
+def database_size() -> int:
+    size = 0
+    for path in (engine.url.database, f"{engine.url.database}-wal"):
+        if os.path.exists(path):
+            size += os.path.getsize(path)
+    return size
+
+def migrate_raw_responses(vacuum: bool = True) -> Dict:
+    """Переносит full_raw_response в сжатую колонку; повторный запуск ничего не меняет"""
+    size_before = database_size()
+    started = time.perf_counter()
+    db = SessionLocal()
+
+    try:
+        duplicates = db.query(LLMResponse).filter(
+            LLMResponse.full_raw_response == LLMResponse.response_text
+        ).update({LLMResponse.full_raw_response: None}, synchronize_session=False)
+        db.commit()
+
+        table = LLMResponse.__table__
+        stmt = table.update().where(table.c.id == bindparam('response_id')).values(
+            raw_response_compressed=bindparam('compressed'),
+            full_raw_response=None
+        )
+        compressed = 0
+        for batch in iter_response_batches(db, LLMResponse.full_raw_response,
+                                           where=LLMResponse.full_raw_response.isnot(None)):
+            db.execute(stmt, [
+                {
+                    'response_id': response_id,
+                    'compressed': zlib.compress(raw.encode('utf-8'), config.RAW_RESPONSE_COMPRESSION_LEVEL)
+                }
+                for response_id, raw in batch
+            ])
+            db.commit()
+            compressed += len(batch)
+
+    finally:
+        db.close()
+
+    if vacuum and (duplicates or compressed):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+            # VACUUM в режиме WAL пишет новую копию базы в журнал - переносим ее в основной файл
+            conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+
+    return {
+        'duplicates_removed': duplicates,
+        'compressed': compressed,
+        'size_before': size_before,
+        'size_after': database_size(),
+        'elapsed': time.perf_counter() - started
+    }
+
+if __name__ == "__main__":
+    result = migrate_raw_responses(vacuum='--no-vacuum' not in sys.argv)
+    print(f"Удалено дублирующих копий: {result['duplicates_removed']}, сжато исходных ответов: {result['compressed']}")
+    print(f"Размер базы: {result['size_before'] / 1e6:.1f} MB -> {result['size_after'] / 1e6:.1f} MB "
+          f"({result['elapsed']:.1f} s)")
@@ -0,0 +1,115 @@
+# modules/reputation_tracker.py
+"""
+Временной ряд репутации продуктов (таблица reputation_tracking)
+Ежедневный снимок на продукт: число упоминаний, средняя тональность и доля упоминаний за день.
+Снимки строятся из дневных агрегатов, чтение истории не обращается к таблице упоминаний.
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from collections import defaultdict
+from datetime import date, datetime, time
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from database import MentionDailyRollup, ReputationTracking, bulk_insert
+
+SENTIMENT_SCORES = {'positive': 1.0, 'neutral': 0.0, 'negative': -1.0}
+
+BUCKETS = ('day', 'week', 'month')
+
+def _bucket_expr(bucket: str):
+    """Начало интервала для date_recorded: день, понедельник недели или первое число месяца"""
+    if bucket == 'day':
+        return func.date(ReputationTracking.date_recorded)
+    if bucket == 'week':
+        return func.date(ReputationTracking.date_recorded, '-6 days', 'weekday 1')
+    if bucket == 'month':
+        return func.date(ReputationTracking.date_recorded, 'start of month')
+    raise ValueError(f"Неизвестный интервал: {bucket}, допустимые: {', '.join(BUCKETS)}")
+
+def record_daily_snapshots(db, since_day: Optional[date] = None) -> int:
+    """
+    Записывает снимки за дни начиная с since_day.
+    По умолчанию с последнего записанного дня (он пересчитывается, т.к. мог быть неполным)
+    или со всей истории агрегатов, если снимков еще нет. Повторный вызов за тот же день заменяет снимки.
+    """
+    if since_day is None:
+        last_recorded = db.query(func.max(ReputationTracking.date_recorded)).scalar()
+        since_day = last_recorded.date() if last_recorded else date.min
+
+    rows = db.query(
+        MentionDailyRollup.day,
+        MentionDailyRollup.product_name,
+        MentionDailyRollup.sentiment,
+        func.sum(MentionDailyRollup.mention_count)
+    ).filter(MentionDailyRollup.day >= since_day).group_by(
+        MentionDailyRollup.day, MentionDailyRollup.product_name, MentionDailyRollup.sentiment
+    )
+
+    counts = defaultdict(int)
+    scores = defaultdict(float)
+    day_totals = defaultdict(int)
+    for day, product_name, sentiment, count in rows:
+        counts[(day, product_name)] += count
+        scores[(day, product_name)] += SENTIMENT_SCORES.get(sentiment, 0.0) * count
+        day_totals[day] += count
+
+    snapshots = [
+        {
+            'product_name': product_name,
+            'mention_count': count,
+            'avg_sentiment_score': round(scores[(day, product_name)] / count, 4),
+            'share': round(count / day_totals[day], 4),
+            'date_recorded': datetime.combine(day, time.min)
+        }
+        for (day, product_name), count in counts.items()
+    ]
+
+    db.query(ReputationTracking).filter(
+        ReputationTracking.date_recorded >= datetime.combine(since_day, time.min)
+    ).delete(synchronize_session=False)
+    bulk_insert(db, ReputationTracking, snapshots)
+    db.commit()
+    return len(snapshots)
+
+def get_reputation_history(db, start_day: date, end_day: date, products: Optional[List[str]] = None,
+                           bucket: str = 'day') -> List[Dict]:
+    """
+    Снимки за период [start_day, end_day], свернутые по интервалам bucket ('day', 'week', 'month').
+    Тональность усредняется с весом по числу упоминаний, доля считается от всех упоминаний интервала.
+    """
+    period = _bucket_expr(bucket)
+    in_range = (
+        ReputationTracking.date_recorded >= datetime.combine(start_day, time.min),
+        ReputationTracking.date_recorded <= datetime.combine(end_day, time.max)
+    )
+
+    period_totals = dict(db.query(
+        period, func.sum(ReputationTracking.mention_count)
+    ).filter(*in_range).group_by(period).all())
+
+    query = db.query(
+        period,
+        ReputationTracking.product_name,
+        func.sum(ReputationTracking.mention_count),
+        func.sum(ReputationTracking.avg_sentiment_score * ReputationTracking.mention_count)
+    ).filter(*in_range)
+    if products:
+        query = query.filter(ReputationTracking.product_name.in_(products))
+    rows = query.group_by(period, ReputationTracking.product_name).order_by(period).all()
+
+    history = []
+    for period_start, product_name, count, weighted_score in rows:
+        if not count:
+            continue
+        history.append({
+            'period': date.fromisoformat(period_start),
+            'product': product_name,
+            'mention_count': count,
+            'avg_sentiment_score': round((weighted_score or 0.0) / count, 4),
+            'share': round(count / period_totals[period_start], 4)
+        })
+    return history
@@ -8,12 +8,20 @@ sys.path.insert(0, parent_dir)
 
 import re
 import json
-from typing import List, Dict, Tuple
-from database import SessionLocal, ProductMention, LLMResponse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Dict, Optional, Tuple
+from sqlalchemy import func, or_
+from database import SessionLocal, ProductMention, LLMResponse, MentionDailyRollup, engine, bulk_insert
+from modules.score_cache import ScoreCache
+from modules.products import PRODUCT_ALIASES, build_trie_pattern, normalize_product_name_fixed, normalize_stored_product_names
+from modules.rollup import apply_mention_deltas, ensure_daily_rollup
+from modules.response_stream import iter_response_batches
 import config
 from textblob import TextBlob
 from textblob.sentiments import PatternAnalyzer
 from collections import defaultdict
+from functools import lru_cache
 import logging
 
 logging.basicConfig(
@@ -26,26 +34,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def normalize_product_name_fixed(name: str) -> str:
-    """Исправленная нормализация имен продуктов"""
-    name_lower = name.lower().strip()
-
-    aliases_map = {
-        'n8n': ['n8n', 'n8n.io', 'n8n cloud', 'n8n.io cloud'],
-        'zapier': ['zapier'],
-        'make': ['make', 'make.com'],
-        'integromat': ['integromat'],
-        'microsoft power automate': ['microsoft power automate', 'power automate'],
-        'ifttt': ['ifttt']
-    }
+# Увеличивать при изменении правил извлечения упоминаний
+ANALYZER_VERSION = 2
 
-    for normalized, variants in aliases_map.items():
-        if name_lower == normalized:
-            return normalized
-        if name_lower in variants:
-            return normalized
-    
-    return name_lower
+score_cache = ScoreCache(
+    config.SCORE_CACHE_MAX_ENTRIES,
+    config.SCORE_CACHE_FILE,
+    namespace=f"analyzer-v{ANALYZER_VERSION}"
+)
+
+SPECIAL_PATTERNS = [
+    (r'Make\s*\(formerly Integromat\)', 'make'),
+    (r'Integromat\s*\(now Make\)', 'make'),
+    (r'Power Automate\s*\(Microsoft\)', 'microsoft power automate'),
+]
+
+MAX_MENTIONS_PER_PRODUCT = 3
+MAX_MENTIONS_PER_SPECIAL = 2
+MIN_MENTION_DISTANCE = 50
+
+class MentionMatcher:
+    """Находит все продукты, их алиасы и специальные шаблоны за один проход по тексту"""
+
+    def __init__(self, products: Tuple[str, ...]):
+        self.variants = {}
+        self.original_names = {}
+        self.product_order = {}
+
+        for product in products:
+            normalized = normalize_product_name_fixed(product)
+            self.original_names.setdefault(normalized, product)
+            self.product_order.setdefault(normalized, len(self.product_order))
+            for variant in [product.lower()] + PRODUCT_ALIASES.get(normalized, []):
+                self.variants.setdefault(variant, normalized)
+
+        # Специальные шаблоны - опережающие проверки нулевой длины, чтобы не поглощать
+        # упоминания продуктов внутри них
+        special_parts = [f'(?=(?P<special_{i}>{pattern}))' for i, (pattern, _) in enumerate(SPECIAL_PATTERNS)]
+        product_part = rf'\b(?P<product>{build_trie_pattern(list(self.variants))})\b'
+        self.pattern = re.compile('|'.join(special_parts + [product_part]), re.IGNORECASE)
+
+    def find(self, text: str) -> Tuple[Dict[str, List[int]], List[Tuple[str, int, int]]]:
+        """
+        Возвращает позиции продуктов (с учетом лимитов и минимального расстояния)
+        и совпадения специальных шаблонов (product_name, start, end)
+        """
+        product_positions = defaultdict(list)
+        product_hits = defaultdict(int)
+        special_hits = defaultdict(list)
+
+        for match in self.pattern.finditer(text):
+            group = match.lastgroup
+
+            if group == 'product':
+                normalized = self.variants[match.group('product').lower()]
+                if product_hits[normalized] >= MAX_MENTIONS_PER_PRODUCT:
+                    continue
+                product_hits[normalized] += 1
+
+                position = match.start()
+                if any(abs(position - existing) < MIN_MENTION_DISTANCE for existing in product_positions[normalized]):
+                    continue
+                product_positions[normalized].append(position)
+
+            elif len(special_hits[group]) < MAX_MENTIONS_PER_SPECIAL:
+                special_hits[group].append((match.start(group), match.end(group)))
+
+        specials = []
+        for i, (_, product_name) in enumerate(SPECIAL_PATTERNS):
+            for start, end in special_hits.get(f'special_{i}', []):
+                specials.append((product_name, start, end))
+
+        ordered_positions = dict(sorted(product_positions.items(), key=lambda item: self.product_order[item[0]]))
+        return ordered_positions, specials
+
+@lru_cache(maxsize=8)
+def get_mention_matcher(products: Tuple[str, ...]) -> MentionMatcher:
+    """Матчер компилируется один раз для набора продуктов"""
+    return MentionMatcher(products)
 
 def extract_product_mentions_fixed(text: str) -> List[Dict]:
     """
@@ -54,73 +120,67 @@ def extract_product_mentions_fixed(text: str) -> List[Dict]:
     """
     mentions = []
 
-    all_products = [config.TARGET_PRODUCT] + config.COMPETITORS
-    found_positions = defaultdict(set)
-    for product in all_products:
-        pattern = re.compile(rf'\b{re.escape(product)}\b', re.IGNORECASE)
-        matches = list(pattern.finditer(text))
-        
-        if matches:
-            max_mentions_per_product = 3
-            matches = matches[:max_mentions_per_product]
-            
-            for match in matches:
-                position = match.start()
-                product_normalized = normalize_product_name_fixed(product)
-                too_close = False
-                for existing_pos in found_positions[product_normalized]:
-                    if abs(position - existing_pos) < 50:
-                        too_close = True
-                        break
-                
-                if too_close:
-                    continue
+    matcher = get_mention_matcher(tuple([config.TARGET_PRODUCT] + config.COMPETITORS))
+    product_positions, specials = matcher.find(text)
 
-                found_positions[product_normalized].add(position)
-
-                start = max(0, position - 100)
-                end = min(len(text), position + 100)
-                context = text[start:end]
-                sentiment = analyze_sentiment_en_fixed(context)
-                attributes = extract_attributes_en_fixed(context, product)
-                is_comparison = is_comparison_mention_fixed(context)
-                mentions.append({
-                    'product_name': product_normalized,
-                    'original_name': product,
-                    'context': context,
-                    'sentiment': sentiment['label'],
-                    'sentiment_score': sentiment['score'],
-                    'attributes': attributes,
-                    'is_comparison': is_comparison,
-                    'position': position
-                })
-
-    special_patterns = [
-        (r'Make\s*\(formerly Integromat\)', 'make'),
-        (r'Integromat\s*\(now Make\)', 'make'),
-        (r'Power Automate\s*\(Microsoft\)', 'microsoft power automate'),
-    ]
-    
-    for pattern, product_name in special_patterns:
-        matches = list(re.finditer(pattern, text, re.IGNORECASE))
-        for match in matches[:2]:
-            start = max(0, match.start() - 100)
-            end = min(len(text), match.end() + 100)
+    for product_normalized, positions in product_positions.items():
+        product = matcher.original_names[product_normalized]
+
+        for position in positions:
+            start = max(0, position - 100)
+            end = min(len(text), position + 100)
             context = text[start:end]
-            
+            scores = score_context(context, product)
             mentions.append({
-                'product_name': product_name,
-                'original_name': product_name,
+                'product_name': product_normalized,
+                'original_name': product,
                 'context': context,
-                'sentiment': analyze_sentiment_en_fixed(context)['label'],
-                'sentiment_score': analyze_sentiment_en_fixed(context)['score'],
-                'attributes': extract_attributes_en_fixed(context, product_name),
-                'is_comparison': is_comparison_mention_fixed(context),
-                'position': match.start()
+                'sentiment': scores['sentiment']['label'],
+                'sentiment_score': scores['sentiment']['score'],
+                'attributes': scores['attributes'],
+                'is_comparison': scores['is_comparison'],
+                'position': position
             })
     
+    for product_name, match_start, match_end in specials:
+        start = max(0, match_start - 100)
+        end = min(len(text), match_end + 100)
+        context = text[start:end]
+        scores = score_context(context, product_name)
+        
+        mentions.append({
+            'product_name': product_name,
+            'original_name': product_name,
+            'context': context,
+            'sentiment': scores['sentiment']['label'],
+            'sentiment_score': scores['sentiment']['score'],
+            'attributes': scores['attributes'],
+            'is_comparison': scores['is_comparison'],
+            'position': match_start
+        })
+    
     return mentions
 
+def score_context(context: str, product: str) -> Dict:
+    """Тональность, атрибуты и признак сравнения для контекста; повторные контексты берутся из кэша"""
+    key = score_cache.make_key(context, product)
+    scores = score_cache.get(key)
+
+    if scores is None:
+        scores = {
+            'sentiment': analyze_sentiment_en_fixed(context),
+            'attributes': extract_attributes_en_fixed(context, product),
+            'is_comparison': is_comparison_mention_fixed(context)
+        }
+        score_cache.put(key, scores)
+
+    return scores
+
+@lru_cache(maxsize=1)
+def get_sentiment_analyzer() -> PatternAnalyzer:
+    """Анализатор TextBlob создается один раз на процесс"""
+    return PatternAnalyzer()
+
 def analyze_sentiment_en_fixed(text: str) -> Dict:
     """Исправленный анализ тональности"""
     try:
@@ -132,7 +192,7 @@ def analyze_sentiment_en_fixed(text: str) -> Dict:
                 'method': 'too_short'
             }
         
-        blob = TextBlob(text, analyzer=PatternAnalyzer())
+        blob = TextBlob(text, analyzer=get_sentiment_analyzer())
         polarity = blob.sentiment.polarity
         text_length_factor = min(len(text) / 50, 1.0)
         keyword_score = analyze_sentiment_keywords_en_fixed(text)
@@ -245,101 +305,195 @@ def is_comparison_mention_fixed(context: str) -> bool:
     
     return False
 
-def process_all_responses():
-    """Обработка всех ответов"""
+def init_analysis_worker():
+    """Инициализация процесса-воркера: свои соединения с БД и однократная загрузка TextBlob"""
+    engine.dispose(close=False)
+    get_sentiment_analyzer()
+    score_cache.load()
+
+def analyze_response_rows(rows: Iterable[Tuple[int, str]]) -> List[Tuple[int, List[Dict]]]:
+    """Извлекает упоминания из пачки строк (id, текст); не пишет в БД"""
+    results = []
+    for response_id, response_text in rows:
+        try:
+            results.append((response_id, extract_product_mentions_fixed(response_text or "")))
+        except Exception as e:
+            logger.error(f"Error processing response {response_id}: {e}")
+    return results
+
+def analyze_response_chunk(response_ids: List[int]) -> List[Tuple[int, List[Dict]]]:
+    """Извлекает упоминания для пачки ответов по id (тексты читает сам - для воркеров)"""
+    db = SessionLocal()
+    try:
+        rows = db.query(LLMResponse.id, LLMResponse.response_text).filter(
+            LLMResponse.id.in_(response_ids)
+        ).all()
+    finally:
+        db.close()
+
+    return analyze_response_rows(rows)
+
+def analyze_response_chunk_in_worker(response_ids: List[int]) -> Tuple[List[Tuple[int, List[Dict]]], Dict]:
+    """Обработка пачки в воркере: результаты плюс новые записи кэша оценок для родителя"""
+    results = analyze_response_chunk(response_ids)
+    return results, score_cache.drain()
+
+def save_chunk_results(db, results: List[Tuple[int, List[Dict]]]) -> int:
+    """Одной транзакцией заменяет упоминания пачки ответов и отмечает версию анализатора"""
+    response_ids = [response_id for response_id, _ in results]
+    if not response_ids:
+        return 0
+
+    rows = []
+    for response_id, mentions in results:
+        for mention in mentions:
+            rows.append({
+                'response_id': response_id,
+                'product_name': mention['product_name'],
+                'context': mention['context'][:500],
+                'sentiment': mention['sentiment'],
+                'attributes': json.dumps(mention['attributes'][:5], ensure_ascii=False)
+            })
+
+    # Старые упоминания удаляются независимо от версии: у ответов, сохраненных до учета версий,
+    # analyzer_version пуст, а упоминания уже есть
+    apply_mention_deltas(db, response_ids, rows)
+    db.query(ProductMention).filter(ProductMention.response_id.in_(response_ids)).delete(synchronize_session=False)
+    bulk_insert(db, ProductMention, rows)
+    db.query(LLMResponse).filter(LLMResponse.id.in_(response_ids)).update(
+        {LLMResponse.analyzer_version: ANALYZER_VERSION, LLMResponse.analyzed_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.commit()
+    return len(rows)
+
+def pending_responses():
+    """Условие для ответов, еще не разобранных текущей версией анализатора"""
+    return or_(LLMResponse.analyzer_version.is_(None), LLMResponse.analyzer_version != ANALYZER_VERSION)
+
+def prepare_mention_tables(db, full_rebuild: bool = False):
+    """Нормализует сохраненные имена; при full_rebuild удаляет упоминания, иначе проверяет агрегаты"""
+    renamed_count = normalize_stored_product_names(db)
+    if renamed_count > 0:
+        logger.info(f"Normalized product names of {renamed_count} stored mentions")
+
+    if full_rebuild:
+        deleted_count = db.query(ProductMention).delete()
+        db.query(MentionDailyRollup).delete()
+        db.query(LLMResponse).update({LLMResponse.analyzer_version: None}, synchronize_session=False)
+        db.commit()
+        if deleted_count > 0:
+            logger.info(f"Cleared {deleted_count} old mentions")
+    else:
+        ensure_daily_rollup(db)
+
+def process_all_responses(full_rebuild: bool = False, workers: Optional[int] = None):
+    """
+    Обработка ответов
+    Обрабатываются только новые ответы и ответы, разобранные старой версией анализатора.
+    full_rebuild=True удаляет все упоминания и разбирает все ответы заново.
+    workers > 1 распределяет пачки ответов по процессам, запись в БД делает родительский процесс.
+    """
+    workers = config.ANALYSIS_WORKERS if workers is None else workers
     db = SessionLocal()
-    responses = db.query(LLMResponse).order_by(LLMResponse.id).all()
-    deleted_count = db.query(ProductMention).delete()
-    if deleted_count > 0:
-        logger.info(f"Cleared {deleted_count} old mentions")
+
+    prepare_mention_tables(db, full_rebuild)
+
+    pending = pending_responses()
+    total_responses = db.query(func.count(LLMResponse.id)).filter(pending).scalar()
     
     total_mentions_count = 0
-    total_responses = len(responses)
-    
-    for idx, response in enumerate(responses, 1):
-        logger.info(f"Processing response {idx}/{total_responses} (ID: {response.id})")
-        
-        try:
-            mentions = extract_product_mentions_fixed(response.response_text)
-            logger.debug(f"Response {response.id}: found {len(mentions)} mentions")
-            for mention in mentions:
-                attributes = mention['attributes']
-                if len(attributes) > 5:
-                    attributes = attributes[:5]
-                
-                mention_record = ProductMention(
-                    response_id=response.id,
-                    product_name=mention['product_name'],
-                    context=mention['context'][:500],
-                    sentiment=mention['sentiment'],
-                    attributes=json.dumps(attributes, ensure_ascii=False)
-                )
-                db.add(mention_record)
-                total_mentions_count += 1
-            
-            db.commit()
+    processed_count = 0
+    chunk_size = config.ANALYSIS_CHUNK_SIZE
+    logger.info(f"Responses to process: {total_responses} (analyzer version {ANALYZER_VERSION}, workers: {workers})")
 
-            if idx % 5 == 0:
-                logger.info(f"Processed {idx}/{total_responses} responses, total mentions: {total_mentions_count}")
-            
+    def save(results):
+        nonlocal total_mentions_count, processed_count
+        try:
+            total_mentions_count += save_chunk_results(db, results)
+            processed_count += len(results)
+            logger.info(f"Processed {processed_count}/{total_responses} responses, total mentions: {total_mentions_count}")
         except Exception as e:
-            logger.error(f"Error processing response {response.id}: {e}")
+            logger.error(f"Error saving mentions for responses {results[0][0]}..{results[-1][0]}: {e}")
             db.rollback()
-            continue
-    
-    db.close()
+
+    score_cache.load()
+
+    try:
+        if workers > 1 and total_responses > chunk_size:
+            # Воркерам передаются только id, тексты каждый воркер читает сам
+            chunks = [[response_id for response_id, in batch]
+                      for batch in iter_response_batches(db, LLMResponse.id, where=pending, batch_size=chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_analysis_worker) as executor:
+                for results, cache_delta in executor.map(analyze_response_chunk_in_worker, chunks):
+                    score_cache.merge(cache_delta['entries'], cache_delta['hits'], cache_delta['misses'])
+                    save(results)
+        else:
+            for batch in iter_response_batches(db, LLMResponse.response_text, where=pending, batch_size=chunk_size):
+                save(analyze_response_rows(batch))
+    finally:
+        db.close()
+        score_cache.save()
+
+    cache_stats = score_cache.stats()
+    logger.info(f"Score cache hits/misses: {cache_stats['hits']}/{cache_stats['misses']} "
+                f"({cache_stats['hit_rate']}%), size: {cache_stats['size']}")
 
     logger.info(f"Processing completed!")
-    logger.info(f"Total responses processed: {total_responses}")
+    logger.info(f"Total responses processed: {processed_count}/{total_responses}")
     logger.info(f"Total mentions extracted: {total_mentions_count}")
 
-    if total_mentions_count > total_responses * 10:
+    if total_responses and total_mentions_count > total_responses * 10:
         logger.warning(f"WARNING: High mentions per response ratio: {total_mentions_count/total_responses:.2f}")
         logger.warning("This may indicate duplicate counting or overly aggressive extraction.")
 
 def generate_reputation_report() -> Tuple[Dict, int]:
-    """Исправленный отчет с проверкой данных"""
+    """Исправленный отчет с проверкой данных (агрегация выполняется в SQL)"""
     db = SessionLocal()
 
-    all_mentions = db.query(ProductMention).all()
-    total_mentions = len(all_mentions)
+    total_mentions = db.query(func.count(ProductMention.id)).scalar() or 0
 
     if total_mentions > 1000:
         logger.warning(f"WARNING: Total mentions ({total_mentions}) seems too high")
         logger.warning("Checking for duplicates...")
 
-        unique_check = {}
-        for mention in all_mentions:
-            key = f"{mention.response_id}_{mention.product_name}_{mention.context[:50]}"
-            unique_check[key] = unique_check.get(key, 0) + 1
-        
-        duplicates = sum(1 for count in unique_check.values() if count > 1)
+        duplicate_groups = db.query(ProductMention.response_id).group_by(
+            ProductMention.response_id,
+            ProductMention.product_name,
+            func.substr(ProductMention.context, 1, 50)
+        ).having(func.count(ProductMention.id) > 1).subquery()
+        duplicates = db.query(func.count()).select_from(duplicate_groups).scalar()
         if duplicates > 0:
             logger.warning(f"Found {duplicates} potential duplicate mentions")
     
+    sentiment_rows = db.query(
+        ProductMention.product_name,
+        ProductMention.sentiment,
+        func.count(ProductMention.id)
+    ).group_by(ProductMention.product_name, ProductMention.sentiment).all()
+
+    db.close()
+
+    totals_by_product = defaultdict(int)
+    sentiment_by_product = defaultdict(lambda: {'positive': 0, 'neutral': 0, 'negative': 0})
+    for product_name, sentiment, count in sentiment_rows:
+        totals_by_product[product_name] += count
+        if sentiment in sentiment_by_product[product_name]:
+            sentiment_by_product[product_name][sentiment] += count
+
     report = {}
     all_products = [config.TARGET_PRODUCT] + config.COMPETITORS
     
     for product in all_products:
-        product_mentions = []
-        for mention in all_mentions:
-            if product.lower() in mention.product_name.lower():
-                product_mentions.append(mention)
+        normalized = normalize_product_name_fixed(product)
+        total = totals_by_product.get(normalized, 0)
         
-        if product_mentions:
-            total = len(product_mentions)
-
-            sentiment_counts = {'positive': 0, 'neutral': 0, 'negative': 0}
-            for mention in product_mentions:
-                if mention.sentiment in sentiment_counts:
-                    sentiment_counts[mention.sentiment] += 1
+        if total:
+            sentiment_counts = dict(sentiment_by_product[normalized])
 
-            if total > 0:
-                positive_pct = round(sentiment_counts['positive'] / total * 100, 1)
-                neutral_pct = round(sentiment_counts['neutral'] / total * 100, 1)
-                negative_pct = round(sentiment_counts['negative'] / total * 100, 1)
-            else:
-                positive_pct = neutral_pct = negative_pct = 0
+            positive_pct = round(sentiment_counts['positive'] / total * 100, 1)
+            neutral_pct = round(sentiment_counts['neutral'] / total * 100, 1)
+            negative_pct = round(sentiment_counts['negative'] / total * 100, 1)
 
             market_share = round(total / total_mentions * 100, 1) if total_mentions > 0 else 0
             
@@ -353,8 +507,6 @@ def generate_reputation_report() -> Tuple[Dict, int]:
                     'negative': negative_pct
                 }
             }
-    
-    db.close()
 
     sorted_report = dict(sorted(report.items(), key=lambda x: x[1]['total_mentions'], reverse=True))
     
@@ -409,7 +561,8 @@ def main():
     """Основная функция"""
     try:
         logger.info("Starting improved reputation analysis...")
-        process_all_responses()
+        workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else None
+        process_all_responses(full_rebuild='--full-rebuild' in sys.argv, workers=workers)
         report, total_mentions = generate_reputation_report()
         print_detailed_report(report, total_mentions)
         logger.info("Improved reputation analysis completed successfully")
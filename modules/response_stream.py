@@ -0,0 +1,42 @@
+# modules/response_stream.py
+"""
+Потоковый обход таблицы ответов LLM
+Ответы читаются пачками по id (keyset-пагинация: WHERE id > последний id ORDER BY id LIMIT n),
+загружаются только запрошенные колонки. Память не зависит от размера таблицы, а запись между
+пачками (например, отметка версии анализатора) не ломает обход, как это было бы с открытым курсором.
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from typing import Iterator, List, Optional
+from database import LLMResponse
+import config
+
+DEFAULT_COLUMNS = (LLMResponse.id, LLMResponse.response_text)
+
+def iter_response_batches(db, *columns, where=None, batch_size: Optional[int] = None) -> Iterator[List]:
+    """
+    Пачки строк (id, *columns) в порядке id; без columns - (id, response_text).
+    where - условие SQLAlchemy для отбора ответов, проверяется на каждой пачке.
+    """
+    batch_size = batch_size or config.RESPONSE_SCAN_BATCH_SIZE
+    columns = [column for column in (columns or DEFAULT_COLUMNS) if column is not LLMResponse.id]
+    last_id = 0
+
+    while True:
+        query = db.query(LLMResponse.id, *columns).filter(LLMResponse.id > last_id)
+        if where is not None:
+            query = query.filter(where)
+        batch = query.order_by(LLMResponse.id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+def iter_responses(db, *columns, where=None, batch_size: Optional[int] = None) -> Iterator:
+    """Те же строки по одной"""
+    for batch in iter_response_batches(db, *columns, where=where, batch_size=batch_size):
+        yield from batch
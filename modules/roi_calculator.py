@@ -8,9 +8,12 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import json
 from datetime import datetime, timedelta
-from typing import Dict
-from database import SessionLocal, ProductMention, LLMResponse, GeneratedContent
+from typing import Dict, List
+from database import SessionLocal, ProductMention, GeneratedContent
 import config
+from modules.products import product_filter, normalize_product_name_fixed
+from modules.rollup import get_period_stats
+from modules.reputation_tracker import get_reputation_history
 
 class ROICalculator:
     def __init__(self):
@@ -68,7 +71,8 @@ class ROICalculator:
                 'net_profit': round(value_increase - content_cost, 2),
                 'interpretation': self.interpret_roi(roi_percentage)
             },
-            'growth': growth_metrics
+            'growth': growth_metrics,
+            'trend': self.get_target_trend()
         }
     
     def check_comparison_possible(self) -> Dict:
@@ -90,15 +94,11 @@ class ROICalculator:
         after_start = content_date
         after_end = min(datetime.utcnow(), content_date + timedelta(days=7))
 
-        mentions_before = self.db.query(ProductMention).join(LLMResponse).filter(
-            LLMResponse.created_at >= before_start,
-            LLMResponse.created_at < before_end
-        ).count()
+        mentions_before = get_period_stats(
+            self.db, before_start.date(), before_end.date(), end_inclusive=False
+        )['total']
         
-        mentions_after = self.db.query(ProductMention).join(LLMResponse).filter(
-            LLMResponse.created_at >= after_start,
-            LLMResponse.created_at <= after_end
-        ).count()
+        mentions_after = get_period_stats(self.db, after_start.date(), after_end.date())['total']
         
         return {
             'has_comparison': mentions_before > 0 and mentions_after > 0,
@@ -115,12 +115,12 @@ class ROICalculator:
         """
         total_mentions = self.db.query(ProductMention).count()
         target_mentions = self.db.query(ProductMention).filter(
-            ProductMention.product_name.ilike(f"%{config.TARGET_PRODUCT}%")
+            product_filter(config.TARGET_PRODUCT)
         ).count()
 
         target_sentiment = {'positive': 0, 'neutral': 0, 'negative': 0}
         target_mentions_list = self.db.query(ProductMention).filter(
-            ProductMention.product_name.ilike(f"%{config.TARGET_PRODUCT}%")
+            product_filter(config.TARGET_PRODUCT)
         ).all()
         
         for mention in target_mentions_list:
@@ -133,7 +133,7 @@ class ROICalculator:
         competitor_stats = {}
         for comp in config.COMPETITORS[:3]:
             count = self.db.query(ProductMention).filter(
-                ProductMention.product_name.ilike(f"%{comp}%")
+                product_filter(comp)
             ).count()
             if count > 0:
                 competitor_stats[comp] = count
@@ -150,7 +150,8 @@ class ROICalculator:
                 'content_cost': content_cost,
                 'competitor_stats': competitor_stats
             },
-            'recommendation': 'Запустите контент-кампанию и повторите анализ через неделю'
+            'recommendation': 'Запустите контент-кампанию и повторите анализ через неделю',
+            'trend': self.get_target_trend()
         }
     
     def calculate_content_cost(self) -> float:
@@ -163,27 +164,19 @@ class ROICalculator:
         if not start_date or not end_date:
             return {'total': 0, 'sentiment': {}, 'target_count': 0}
 
-        mentions = self.db.query(ProductMention).join(LLMResponse).filter(
-            LLMResponse.created_at >= start_date,
-            LLMResponse.created_at <= end_date
-        ).all()
-
-        sentiment_counts = {'positive': 0, 'neutral': 0, 'negative': 0}
-        target_count = 0
-        
-        for mention in mentions:
-
-            if mention.sentiment in sentiment_counts:
-                sentiment_counts[mention.sentiment] += 1
-
-            if config.TARGET_PRODUCT.lower() in mention.product_name.lower():
-                target_count += 1
-        
-        return {
-            'total': len(mentions),
-            'sentiment': sentiment_counts,
-            'target_count': target_count
-        }
+        return get_period_stats(
+            self.db, start_date.date(), end_date.date(),
+            target_product=normalize_product_name_fixed(config.TARGET_PRODUCT)
+        )
+    
+    def get_target_trend(self, weeks: int = 12) -> List[Dict]:
+        """Понедельная динамика целевого продукта по снимкам репутации"""
+        end_day = datetime.utcnow().date()
+        history = get_reputation_history(
+            self.db, end_day - timedelta(weeks=weeks), end_day,
+            products=[normalize_product_name_fixed(config.TARGET_PRODUCT)], bucket='week'
+        )
+        return [dict(point, period=point['period'].isoformat()) for point in history]
     
     def calculate_mentions_value(self, stats: Dict) -> float:
         """Рассчитывает денежную ценность упоминаний"""
@@ -309,6 +302,12 @@ class ROICalculator:
             print(f"   • Чистая прибыль: ${roi_data['roi']['net_profit']}")
             print(f"   • Оценка: {roi_data['roi']['interpretation']}")
 
+        if roi_data['trend']:
+            print(f"\nДИНАМИКА ПО НЕДЕЛЯМ:")
+            for point in roi_data['trend']:
+                print(f"   • {point['period']}: {point['mention_count']} упоминаний, "
+                      f"доля {point['share'] * 100:.1f}%, тональность {point['avg_sentiment_score']:+.2f}")
+
         with open('roi_simple_report.json', 'w', encoding='utf-8') as f:
             json.dump(roi_data, f, ensure_ascii=False, indent=2)
         
@@ -0,0 +1,149 @@
+# modules/rollup.py
+"""
+Дневные агрегаты упоминаний (дата, продукт, тональность, источник запроса)
+Обновляются инкрементально при записи упоминаний; запросы по периодам читают их вместо сырых строк
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import LLMQuery, LLMResponse, MentionDailyRollup, ProductMention
+
+UNKNOWN_SOURCE = 'unknown'
+
+def _response_keys(db, response_ids: List[int]) -> Dict[int, tuple]:
+    """(день, источник запроса) для каждого ответа"""
+    rows = db.query(LLMResponse.id, LLMResponse.created_at, LLMQuery.source).outerjoin(
+        LLMQuery, LLMResponse.query_id == LLMQuery.id
+    ).filter(LLMResponse.id.in_(response_ids))
+
+    return {
+        response_id: ((created_at or datetime.utcnow()).date(), source or UNKNOWN_SOURCE)
+        for response_id, created_at, source in rows
+    }
+
+def apply_mention_deltas(db, response_ids: List[int], new_rows: Iterable[Dict]):
+    """
+    Переносит в агрегаты замену упоминаний для ответов response_ids на new_rows.
+    Вызывается до удаления старых упоминаний, в той же транзакции.
+    """
+    if not response_ids:
+        return
+
+    keys = _response_keys(db, response_ids)
+    deltas = Counter()
+
+    old_counts = db.query(
+        ProductMention.response_id,
+        ProductMention.product_name,
+        ProductMention.sentiment,
+        func.count(ProductMention.id)
+    ).filter(ProductMention.response_id.in_(response_ids)).group_by(
+        ProductMention.response_id, ProductMention.product_name, ProductMention.sentiment
+    )
+    for response_id, product_name, sentiment, count in old_counts:
+        day, source = keys[response_id]
+        deltas[(day, product_name, sentiment or '', source)] -= count
+
+    for row in new_rows:
+        day, source = keys[row['response_id']]
+        deltas[(day, row['product_name'], row['sentiment'] or '', source)] += 1
+
+    _upsert(db, deltas)
+
+def _upsert(db, deltas: Counter):
+    changes = [
+        {'day': day, 'product_name': product_name, 'sentiment': sentiment,
+         'query_source': source, 'mention_count': delta}
+        for (day, product_name, sentiment, source), delta in deltas.items() if delta
+    ]
+    if not changes:
+        return
+
+    table = MentionDailyRollup.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['day', 'product_name', 'sentiment', 'query_source'],
+        set_={'mention_count': table.c.mention_count + stmt.excluded.mention_count}
+    )
+    db.execute(stmt, changes)
+    db.query(MentionDailyRollup).filter(MentionDailyRollup.mention_count <= 0).delete(synchronize_session=False)
+
+def rebuild_daily_rollup(db) -> int:
+    """Пересчитывает агрегаты по всем упоминаниям одним GROUP BY"""
+    db.query(MentionDailyRollup).delete(synchronize_session=False)
+
+    day = func.date(LLMResponse.created_at)
+    sentiment = func.coalesce(ProductMention.sentiment, '')
+    source = func.coalesce(LLMQuery.source, UNKNOWN_SOURCE)
+    rows = db.query(day, ProductMention.product_name, sentiment, source, func.count(ProductMention.id)).join(
+        LLMResponse, ProductMention.response_id == LLMResponse.id
+    ).outerjoin(
+        LLMQuery, LLMResponse.query_id == LLMQuery.id
+    ).group_by(day, ProductMention.product_name, sentiment, source)
+
+    deltas = Counter()
+    for day_value, product_name, sentiment_value, source_value, count in rows:
+        day_key = date.fromisoformat(day_value) if day_value else date.today()
+        deltas[(day_key, product_name, sentiment_value, source_value)] += count
+
+    _upsert(db, deltas)
+    db.commit()
+    return len(deltas)
+
+def ensure_daily_rollup(db):
+    """Строит агрегаты для базы, где упоминания есть, а агрегатов еще нет"""
+    if db.query(MentionDailyRollup.id).first() is None and db.query(ProductMention.id).first() is not None:
+        rebuild_daily_rollup(db)
+
+def _day_filter(query, start_day: date, end_day: date, end_inclusive: bool):
+    query = query.filter(MentionDailyRollup.day >= start_day)
+    if end_inclusive:
+        return query.filter(MentionDailyRollup.day <= end_day)
+    return query.filter(MentionDailyRollup.day < end_day)
+
+def get_daily_product_counts(db, start_day: date, end_day: date) -> List[tuple]:
+    """(день, продукт, количество) за период"""
+    query = db.query(
+        MentionDailyRollup.day,
+        MentionDailyRollup.product_name,
+        func.sum(MentionDailyRollup.mention_count)
+    )
+    return _day_filter(query, start_day, end_day, True).group_by(
+        MentionDailyRollup.day, MentionDailyRollup.product_name
+    ).all()
+
+def get_period_stats(db, start_day: date, end_day: date, target_product: Optional[str] = None,
+                     end_inclusive: bool = True) -> Dict:
+    """Всего упоминаний, разбивка по тональности и число упоминаний target_product за период"""
+    query = db.query(
+        MentionDailyRollup.product_name,
+        MentionDailyRollup.sentiment,
+        func.sum(MentionDailyRollup.mention_count)
+    )
+    rows = _day_filter(query, start_day, end_day, end_inclusive).group_by(
+        MentionDailyRollup.product_name, MentionDailyRollup.sentiment
+    ).all()
+
+    sentiment_counts = {'positive': 0, 'neutral': 0, 'negative': 0}
+    total = 0
+    target_count = 0
+    for product_name, sentiment, count in rows:
+        total += count
+        if sentiment in sentiment_counts:
+            sentiment_counts[sentiment] += count
+        if target_product and product_name == target_product:
+            target_count += count
+
+    return {
+        'total': total,
+        'sentiment': sentiment_counts,
+        'target_count': target_count
+    }
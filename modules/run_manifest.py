@@ -0,0 +1,101 @@
+# modules/run_manifest.py
+"""
+Манифесты запусков запросов к LLM
+Прерванный запуск продолжается только с незавершенных запросов
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from database import SessionLocal, AnalysisSession, RunManifestItem
+
+# Прерванный запуск остается 'running', законченный с неудачными пунктами - 'partial'
+RESUMABLE_STATUSES = ('running', 'partial')
+
+def start_or_resume_run(session_type: str, queries: List[str],
+                        max_age_hours: Optional[float] = None) -> Tuple[int, List[Tuple[int, int, str]]]:
+    """
+    Находит незавершенный запуск (прерванный или с неудачными пунктами) с тем же набором запросов
+    или создает новый.
+    Возвращает ID сессии и список незавершенных пунктов (item_id, query_index, query_text).
+    """
+    db = SessionLocal()
+
+    try:
+        unfinished = db.query(AnalysisSession).filter(
+            AnalysisSession.session_type == session_type,
+            AnalysisSession.status.in_(RESUMABLE_STATUSES)
+        ).order_by(AnalysisSession.started_at.desc()).all()
+
+        resumable = None
+        for session in unfinished:
+            items = db.query(RunManifestItem).filter_by(session_id=session.id).all()
+            is_fresh = max_age_hours is None or session.started_at >= datetime.utcnow() - timedelta(hours=max_age_hours)
+
+            if resumable is None and is_fresh and sorted(item.query_text for item in items) == sorted(queries):
+                resumable = session
+            else:
+                session.status = 'abandoned'
+                session.completed_at = datetime.utcnow()
+
+        if resumable is not None:
+            resumable.status = 'running'
+            resumable.completed_at = None
+        else:
+            resumable = AnalysisSession(session_type=session_type, status='running')
+            db.add(resumable)
+            db.flush()
+
+            db.add_all([
+                RunManifestItem(session_id=resumable.id, query_index=idx, query_text=query_text)
+                for idx, query_text in enumerate(queries, 1)
+            ])
+
+        db.commit()
+
+        pending = db.query(RunManifestItem).filter(
+            RunManifestItem.session_id == resumable.id,
+            RunManifestItem.status != 'done'
+        ).order_by(RunManifestItem.query_index).all()
+
+        return resumable.id, [(item.id, item.query_index, item.query_text) for item in pending]
+
+    finally:
+        db.close()
+
+def mark_item(db, item_id: Optional[int], status: str, response_id: Optional[int] = None):
+    """Отмечает пункт манифеста в текущей транзакции (коммит делает вызывающий код)"""
+    if item_id is None:
+        return
+
+    item = db.get(RunManifestItem, item_id)
+    if item:
+        item.status = status
+        item.response_id = response_id
+
+def finish_run(session_id: int, error_message: Optional[str] = None) -> dict:
+    """Закрывает запуск и возвращает счетчики пунктов по статусам"""
+    db = SessionLocal()
+
+    try:
+        items = db.query(RunManifestItem).filter_by(session_id=session_id).all()
+        counts = {'done': 0, 'failed': 0, 'pending': 0}
+        for item in items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+
+        session = db.get(AnalysisSession, session_id)
+        if session:
+            session.queries_count = counts['done']
+            session.completed_at = datetime.utcnow()
+            session.status = 'completed' if counts['done'] == len(items) else 'partial'
+            session.error_message = error_message
+            db.commit()
+
+        return counts
+
+    finally:
+        db.close()
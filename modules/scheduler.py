@@ -15,10 +15,15 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
 from modules.llm_query import query_mistral
+from modules import mistral_client
+from modules import run_manifest
 from modules.response_analyzer import process_all_responses
-from database import SessionLocal, LLMQuery
+from modules.reputation_tracker import record_daily_snapshots
+from database import SessionLocal, LLMQuery, LLMResponse
 import config
 
+DAILY_RUN_TYPE = 'daily_queries'
+
 class DailyUpdater:
     def __init__(self):
         self.setup_logging()
@@ -50,6 +55,7 @@ class DailyUpdater:
             new_queries_count = self.make_daily_queries()
             self.logger.info("Анализирую новые ответы...")
             process_all_responses()
+            self.update_reputation_tracking()
             self.update_influence_index()
             end_time = datetime.now()
             duration = (end_time - start_time).total_seconds() / 60
@@ -72,18 +78,26 @@ class DailyUpdater:
             self.is_running = False
     
     def make_daily_queries(self):
-        """Выполняет ежедневные запросы"""
-        self.logger.info(f"Выполняю {len(config.DAILY_QUERIES)} ежедневных запросов")
+        """
+        Выполняет ежедневные запросы
+        Каждый ответ коммитится сразу; прерванный запуск продолжается с незавершенных запросов
+        """
+        total = len(config.DAILY_QUERIES)
+        session_id, pending = run_manifest.start_or_resume_run(
+            DAILY_RUN_TYPE, config.DAILY_QUERIES, max_age_hours=config.DAILY_RUN_RESUME_HOURS
+        )
         
-        success_count = 0
-        db = SessionLocal()
+        if len(pending) < total:
+            self.logger.info(f"Продолжаю запуск {session_id}: осталось {len(pending)} из {total} запросов")
+        else:
+            self.logger.info(f"Выполняю {total} ежедневных запросов")
         
-        try:
-            for i, query_text in enumerate(config.DAILY_QUERIES, 1):
-                try:
-                    self.logger.info(f"[{i}/{len(config.DAILY_QUERIES)}] Запрос: {query_text[:60]}...")
+        for n, (item_id, i, query_text) in enumerate(pending, 1):
+            db = SessionLocal()
+            try:
+                self.logger.info(f"[{i}/{total}] Запрос: {query_text[:60]}...")
 
-                    full_prompt = f"""Please provide current information about workflow automation tools.
+                full_prompt = f"""Please provide current information about workflow automation tools.
 Focus on recent developments, updates, and market changes in 2025.
 Be objective and mention specific tools when relevant.
 
@@ -91,43 +105,56 @@ Query: {query_text}
 
 Provide up-to-date information:"""
 
-                    response_text = query_mistral(full_prompt)
+                response_text = query_mistral(full_prompt, use_cache=False)
+                
+                if response_text:
+                    query_record = LLMQuery(
+                        query_text=query_text,
+                        llm_model=config.MISTRAL_MODEL,
+                        source='daily'
+                    )
+                    db.add(query_record)
+                    db.flush()
                     
-                    if response_text:
-                        query_record = LLMQuery(
-                            query_text=query_text,
-                            llm_model=config.MISTRAL_MODEL
-                        )
-                        db.add(query_record)
-                        db.flush()
-                        
-                        from database import LLMResponse
-                        response_record = LLMResponse(
-                            query_id=query_record.id,
-                            response_text=response_text,
-                            full_raw_response=response_text
-                        )
-                        db.add(response_record)
-                        
-                        success_count += 1
-                        self.logger.info(f"Успешно сохранен ответ {i}")
+                    response_record = LLMResponse(
+                        query_id=query_record.id,
+                        response_text=response_text
+                    )
+                    db.add(response_record)
+                    db.flush()
                     
-                    if i < len(config.DAILY_QUERIES):
-                        time.sleep(2)
-                        
-                except Exception as e:
-                    self.logger.error(f"Ошибка в запросе {i}: {e}")
-                    continue
-            
-            db.commit()
-            self.logger.info(f"Успешно выполнено запросов: {success_count}/{len(config.DAILY_QUERIES)}")
-            
-            return success_count
-            
+                    run_manifest.mark_item(db, item_id, 'done', response_record.id)
+                    db.commit()
+                    self.logger.info(f"Успешно сохранен ответ {i}")
+                else:
+                    run_manifest.mark_item(db, item_id, 'failed')
+                    db.commit()
+                
+                if n < len(pending):
+                    time.sleep(2)
+                    
+            except Exception as e:
+                db.rollback()
+                self.logger.error(f"Ошибка в запросе {i}: {e}")
+                continue
+            finally:
+                db.close()
+        
+        counts = run_manifest.finish_run(session_id)
+        self.logger.info(f"Успешно выполнено запросов: {counts['done']}/{total}")
+        self.logger.info(mistral_client.format_stats())
+        
+        return counts['done']
+    
+    def update_reputation_tracking(self):
+        """Дописывает дневные снимки репутации продуктов"""
+        db = SessionLocal()
+        try:
+            snapshots_count = record_daily_snapshots(db)
+            self.logger.info(f"Снимков репутации записано: {snapshots_count}")
         except Exception as e:
             db.rollback()
-            self.logger.error(f"Ошибка в make_daily_queries: {e}")
-            return 0
+            self.logger.error(f"Ошибка при записи снимков репутации: {e}")
         finally:
             db.close()
     
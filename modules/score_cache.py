@@ -0,0 +1,96 @@
+# modules/score_cache.py
+"""
+Ограниченный LRU-кэш результатов анализа контекста
+Ключ - хэш контекста, опционально сохраняется на диск между запусками
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+class ScoreCache:
+    def __init__(self, max_entries: int, path: Optional[str] = None, namespace: str = ""):
+        self.max_entries = max_entries
+        self.path = path
+        self.namespace = namespace
+        self.entries: "OrderedDict[str, Any]" = OrderedDict()
+        self.new_entries: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.loaded = False
+
+    def make_key(self, *parts: str) -> str:
+        """Хэш частей ключа (контекст, продукт)"""
+        return hashlib.sha1('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.new_entries[key] = value
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def merge(self, entries: Dict[str, Any], hits: int = 0, misses: int = 0):
+        """Добавляет записи и счетчики, собранные в другом процессе"""
+        for key, value in entries.items():
+            self.put(key, value)
+        self.hits += hits
+        self.misses += misses
+
+    def drain(self) -> Dict:
+        """Возвращает и сбрасывает новые записи и счетчики (для передачи из воркера)"""
+        delta = {'entries': self.new_entries, 'hits': self.hits, 'misses': self.misses}
+        self.new_entries = {}
+        self.hits = 0
+        self.misses = 0
+        return delta
+
+    def load(self):
+        """Загружает записи с диска; файл другой версии игнорируется"""
+        if self.loaded or not self.path or not os.path.exists(self.path):
+            self.loaded = True
+            return
+
+        self.loaded = True
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('namespace') == self.namespace:
+                for key, value in data.get('entries', {}).items():
+                    self.entries[key] = value
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить кэш оценок {self.path}: {e}")
+
+    def save(self):
+        """Сохраняет записи на диск, если появились новые"""
+        if not self.path or not self.new_entries:
+            return
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'namespace': self.namespace, 'entries': self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.new_entries = {}
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total * 100, 1) if total else 0.0,
+            'size': len(self.entries)
+        }
@@ -11,219 +11,384 @@ sys.path.insert(0, parent_dir)
 import re
 import time
 import json
-from collections import Counter
-from typing import List, Dict
+from collections import Counter, defaultdict
+from functools import lru_cache
+from datetime import datetime
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 from urllib.parse import urlparse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from database import SessionLocal, AuthoritativeSource, LLMResponse, BlindSpot
+from database import SessionLocal, AuthoritativeSource, LLMResponse, bulk_insert
+from modules.products import build_trie_pattern
+from modules.text_search import matching_ids, product_response_ids
+from modules import blind_spots as blind_spot_store
+from modules.response_stream import iter_response_batches, iter_responses
 import config
 
+# (тип источника, шаблон, начало совпадения, окончание после группы [A-Za-z0-9\s.-]+ или None)
+CITATION_PATTERNS = [
+    ('url', r'https?://(?:www\.)?([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})(?:/[^\s]*)?', r'https?://', None),
+
+    ('site', r'(?:on|in|according to|based on|from) (?:website|platform|resource) ([A-Za-z0-9\s.-]+)',
+     r'(?:on|in|according to|based on|from) (?:website|platform|resource) ', None),
+    ('site', r'(?:on|at) ([A-Za-z0-9\s.-]+\.(?:com|org|net|io))', r'(?:on|at) ', r'\.(?:com|org|net|io)'),
+
+    ('article', r'in (?:article|research|study|review) "([^"]+)"', r'in (?:article|research|study|review) "', None),
+    ('article', r'according to the ([A-Za-z0-9\s.-]+) (?:article|study)', r'according to the ', r' (?:article|study)'),
+
+    ('blog', r'in the ([A-Za-z0-9\s.-]+) blog', r'in the ', r' blog'),
+    ('blog', r'on ([A-Za-z0-9\s.-]+)\'s blog', r'on ', r"'s blog"),
+    
+    ('forum', r'on (?:forum|platform|community) ([A-Za-z0-9\s.-]+)', r'on (?:forum|platform|community) ', None),
+    ('forum', r'at ([A-Za-z0-9\s.-]+) forums', r'at ', r' forums'),
+
+    ('github', r'GitHub(?: repository)? ([a-zA-Z0-9_-]+/[a-zA-Z0-9_-]+)', r'GitHub', None),
+    ('github', r'on GitHub: ([a-zA-Z0-9_-]+/[a-zA-Z0-9_-]+)', r'on GitHub: ', None),
+
+    ('docs', r'in the ([A-Za-z0-9\s.-]+) documentation', r'in the ', r' documentation'),
+    ('docs', r'according to ([A-Za-z0-9\s.-]+) docs', r'according to ', r' docs'),
+]
+
+KNOWN_PLATFORMS = {
+    'medium.com': 'Medium',
+    'dev.to': 'DEV Community',
+    'github.com': 'GitHub',
+    'stackoverflow.com': 'Stack Overflow',
+    'reddit.com': 'Reddit',
+    'wikipedia.org': 'Wikipedia',
+    'arxiv.org': 'arXiv',
+    'towardsdatascience.com': 'Towards Data Science',
+    'techcrunch.com': 'TechCrunch',
+    'producthunt.com': 'Product Hunt',
+    'hackernews.com': 'Hacker News',
+    'g2.com': 'G2',
+    'capterra.com': 'Capterra',
+    'youtube.com': 'Youtube',
+}
+
+# Символы, на которых обрывается группа [A-Za-z0-9\s.-]+ (с IGNORECASE, как в самих шаблонах)
+RUN_BREAK = re.compile(r'[^A-Za-z0-9\s.-]', re.IGNORECASE)
+
+# Символы, которые re.IGNORECASE сопоставляет с латинскими буквами, а lower() - нет
+CASE_FOLD_EXCEPTIONS = re.compile('[\u0130\u0131\u017f]')
+
+def run_start(text: str, low: int, high: int) -> int:
+    """Начало участка без символов-разрывов, который заканчивается в high (не раньше low); поиск идет назад"""
+    window = 64
+    while high > low:
+        start = max(low, high - window)
+        last_break = None
+        for last_break in RUN_BREAK.finditer(text, start, high):
+            pass
+        if last_break:
+            return last_break.end()
+        high, window = start, window * 4
+    return low
+
+class CitationMatcher:
+    """
+    Находит ссылки на источники и известные платформы за один проход regex по тексту.
+    Общий regex - шлюз из начал шаблонов ("https://", "on website ", "GitHub"), окончаний шаблонов вида
+    "начало (жадная группа) окончание" (" blog", " documentation", ".com") и ключевых слов платформ,
+    за которым идут необязательные опережающие проверки с группой на каждую часть:
+    в одной позиции видны все сработавшие части сразу.
+    Шаблоны с характерным началом проверяются в позиции начала. Для шаблона с окончанием начало ищется
+    назад от найденного окончания, в пределах участка без символов-разрывов.
+    Для каждого шаблона результат совпадает с отдельным finditer, порядок - по шаблонам.
+    """
+
+    def __init__(self, patterns: List[Tuple[str, str, str, Optional[str]]], platforms: Dict[str, str]):
+        self.patterns = []
+        self.leads = {}
+        # Начала и окончания приводятся к нижнему регистру - в них нет экранированных классов вроде \\S
+        parts = defaultdict(list)
+        for index, (source_type, pattern, lead, suffix) in enumerate(patterns):
+            self.patterns.append((source_type, re.compile(pattern, re.IGNORECASE)))
+            if suffix:
+                self.leads[index] = re.compile(lead, re.IGNORECASE)
+                parts[suffix.lower()].append(('suffix', index))
+            else:
+                parts[lead.lower()].append(('start', index))
+
+        self.platforms = platforms
+        self.platform_keys = {keyword.lower(): keyword for keyword in platforms}
+        parts[build_trie_pattern(sorted(self.platform_keys))].append(('platform', None))
+
+        self.groups = [None] + list(parts.values())
+        source = ('(?=' + '|'.join(f'(?:{regex})' for regex in parts) + ')'
+                  + ''.join(f'(?=({regex}))?' for regex in parts))
+        # Проход по тексту в нижнем регистре без IGNORECASE заметно быстрее; исходный текст - если lower()
+        # меняет длину или в тексте есть символы, которые регистр сопоставляет иначе
+        self.scanner = re.compile(source)
+        self.scanner_ignorecase = re.compile(source, re.IGNORECASE)
+
+    def scan(self, text: str) -> Tuple[List[Tuple[int, re.Match]], List[Tuple[str, int]]]:
+        """
+        Один проход по тексту: (номер шаблона, совпадение) в порядке шаблонов, как при отдельном finditer
+        на каждый, и (ключевое слово платформы, позиция первого вхождения) в порядке словаря платформ
+        """
+        found = [[] for _ in self.patterns]
+        last_end = [0] * len(self.patterns)
+        first_seen = {}
+
+        scanned, scanner = text.lower(), self.scanner
+        if len(scanned) != len(text) or CASE_FOLD_EXCEPTIONS.search(text):
+            scanned, scanner = text, self.scanner_ignorecase
+
+        for hit in scanner.finditer(scanned):
+            position = hit.start()
+
+            # В позиции может начинаться несколько частей (например, "on platform X" - site и forum),
+            # поэтому просматриваются все сработавшие группы, а не первая
+            for group, span in enumerate(hit.regs):
+                if span[0] < 0 or not group:
+                    continue
+
+                for kind, index in self.groups[group]:
+                    if kind == 'start':
+                        if position >= last_end[index]:
+                            match = self.patterns[index][1].match(text, position)
+                            if match:
+                                found[index].append(match)
+                                last_end[index] = match.end()
+
+                    elif kind == 'suffix':
+                        if position <= last_end[index]:
+                            continue
+                        # Начало и группа не содержат символов-разрывов: начало ищется назад от окончания,
+                        # в пределах его участка и после конца предыдущего совпадения
+                        low = run_start(text, last_end[index], position)
+                        for lead in self.leads[index].finditer(text, low, position):
+                            match = self.patterns[index][1].match(text, lead.start())
+                            if match:
+                                found[index].append(match)
+                                last_end[index] = match.end()
+                                break
+
+                    else:
+                        keyword = self.platform_keys.get(scanned[span[0]:span[1]].lower())
+                        if keyword:
+                            first_seen.setdefault(keyword, position)
+
+        citations = [(index, match) for index, matches in enumerate(found) for match in matches]
+        platforms = [(keyword, first_seen[keyword]) for keyword in self.platforms if keyword in first_seen]
+        return citations, platforms
+
+@lru_cache(maxsize=1)
+def get_citation_matcher() -> CitationMatcher:
+    return CitationMatcher(CITATION_PATTERNS, KNOWN_PLATFORMS)
+
 def extract_cited_sources(text: str) -> List[Dict]:
     """
     Извлекает упоминания источников из английского текста ответов LLM
     Возвращает список словарей с информацией об источниках
     """
     sources = []
+    matcher = get_citation_matcher()
+    citations, platforms = matcher.scan(text)
 
-    patterns = [
-        (r'https?://(?:www\.)?([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})(?:/[^\s]*)?', 'url'),
+    for index, match in citations:
+        source_type = matcher.patterns[index][0]
+        source_name = match.group(1).strip()
 
-        (r'(?:on|in|according to|based on|from) (?:website|platform|resource) ([A-Za-z0-9\s.-]+)', 'site'),
-        (r'(?:on|at) ([A-Za-z0-9\s.-]+\.(?:com|org|net|io))', 'site'),
+        if source_type == 'url':
+            try:
+                parsed = urlparse(f"http://{source_name}" if '://' not in source_name else source_name)
+                source_name = parsed.netloc or parsed.path.split('/')[0]
+            except:
+                pass
 
-        (r'in (?:article|research|study|review) "([^"]+)"', 'article'),
-        (r'according to the ([A-Za-z0-9\s.-]+) (?:article|study)', 'article'),
+        start = max(0, match.start() - 100)
+        end = min(len(text), match.end() + 100)
+        context = text[start:end]
 
-        (r'in the ([A-Za-z0-9\s.-]+) blog', 'blog'),
-        (r'on ([A-Za-z0-9\s.-]+)\'s blog', 'blog'),
+        quote_start = match.end()
+        quote_end = min(len(text), quote_start + 300)
+        quote = text[quote_start:quote_end].split('.')[0] + '.'
         
-        (r'on (?:forum|platform|community) ([A-Za-z0-9\s.-]+)', 'forum'),
-        (r'at ([A-Za-z0-9\s.-]+) forums', 'forum'),
-
-        (r'GitHub(?: repository)? ([a-zA-Z0-9_-]+/[a-zA-Z0-9_-]+)', 'github'),
-        (r'on GitHub: ([a-zA-Z0-9_-]+/[a-zA-Z0-9_-]+)', 'github'),
-
-        (r'in the ([A-Za-z0-9\s.-]+) documentation', 'docs'),
-        (r'according to ([A-Za-z0-9\s.-]+) docs', 'docs'),
-    ]
-
-    for pattern, source_type in patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        for match in matches:
-            source_name = match.group(1).strip()
-
-            if source_type == 'url':
-                try:
-                    parsed = urlparse(f"http://{source_name}" if '://' not in source_name else source_name)
-                    source_name = parsed.netloc or parsed.path.split('/')[0]
-                except:
-                    pass
-
-            start = max(0, match.start() - 100)
-            end = min(len(text), match.end() + 100)
-            context = text[start:end]
-
-            quote_start = match.end()
-            quote_end = min(len(text), quote_start + 300)
-            quote = text[quote_start:quote_end].split('.')[0] + '.'
-            
-            sources.append({
-                'source_name': source_name,
-                'source_type': source_type,
-                'context': context,
-                'quote': quote.strip(),
-                'full_match': match.group(0)
-            })
+        sources.append({
+            'source_name': source_name,
+            'source_type': source_type,
+            'context': context,
+            'quote': quote.strip(),
+            'full_match': match.group(0)
+        })
 
-    known_platforms = {
-        'medium.com': 'Medium',
-        'dev.to': 'DEV Community',
-        'github.com': 'GitHub',
-        'stackoverflow.com': 'Stack Overflow',
-        'reddit.com': 'Reddit',
-        'wikipedia.org': 'Wikipedia',
-        'arxiv.org': 'arXiv',
-        'towardsdatascience.com': 'Towards Data Science',
-        'techcrunch.com': 'TechCrunch',
-        'producthunt.com': 'Product Hunt',
-        'hackernews.com': 'Hacker News',
-        'g2.com': 'G2',
-        'capterra.com': 'Capterra',
-        'youtube.com': 'Youtube',
-    }
-    
-    text_lower = text.lower()
-    for url_keyword, platform_name in known_platforms.items():
-        if url_keyword in text_lower:
-            idx = text_lower.find(url_keyword)
-            start = max(0, idx - 100)
-            end = min(len(text), idx + len(url_keyword) + 100)
-            context = text[start:end]
-            
-            sources.append({
-                'source_name': platform_name,
-                'source_type': 'known_platform',
-                'context': context,
-                'quote': context[:150] + '...',
-                'full_match': url_keyword
-            })
+    for url_keyword, idx in platforms:
+        start = max(0, idx - 100)
+        end = min(len(text), idx + len(url_keyword) + 100)
+        context = text[start:end]
+        
+        sources.append({
+            'source_name': matcher.platforms[url_keyword],
+            'source_type': 'known_platform',
+            'context': context,
+            'quote': context[:150] + '...',
+            'full_match': url_keyword
+        })
     
     return sources
 
+class SourceCollector:
+    """Накапливает счетчики источников по ответам; память зависит от числа разных источников, а не ответов"""
+
+    MIN_RESPONSE_LENGTH = 100
+
+    def __init__(self):
+        self.source_counter = Counter()
+        self.example_quotes = {}
+        self.names_by_type = defaultdict(set)
+
+    def add(self, sources: List[Dict]):
+        for source in sources:
+            self.source_counter[source['source_name']] += 1
+            self.example_quotes.setdefault(source['source_name'], source['quote'])
+            self.names_by_type[source['source_type']].add(source['source_name'])
+
+    def merge(self, other: 'SourceCollector'):
+        """Добавляет счетчики другого сборщика (например, пачки из процесса-воркера)"""
+        self.source_counter.update(other.source_counter)
+        for source_name, quote in other.example_quotes.items():
+            self.example_quotes.setdefault(source_name, quote)
+        for source_type, names in other.names_by_type.items():
+            self.names_by_type[source_type] |= names
+
+    def consume(self, rows: Iterable[Tuple[int, str]]):
+        """Пачка строк (id, текст) из общего обхода ответов"""
+        for _, response_text in rows:
+            if response_text and len(response_text) > self.MIN_RESPONSE_LENGTH:
+                self.add(extract_cited_sources(response_text))
+
 def analyze_all_responses() -> Dict:
     """
     Анализирует все ответы в базе данных и выявляет источники
     """
     db = SessionLocal()
 
-    responses = db.query(LLMResponse).all()
-    
-    all_sources = []
-    source_counter = Counter()
-    
-    print(f"Анализирую источники в {len(responses)} ответах LLM...")
+    total_responses = db.query(func.count(LLMResponse.id)).scalar()
+    print(f"Анализирую источники в {total_responses} ответах LLM...")
+
+    collector = SourceCollector()
+    for batch in iter_response_batches(db, LLMResponse.response_text,
+                                       where=func.length(LLMResponse.response_text) > SourceCollector.MIN_RESPONSE_LENGTH):
+        collector.consume(batch)
+
+    save_authoritative_sources(db, collector)
+    report = build_sources_report(collector, total_responses, find_blind_spots(db, collector.source_counter))
     
-    for response in responses:
-        if len(response.response_text) > 100:
-            sources = extract_cited_sources(response.response_text)
-            all_sources.extend(sources)
-            for source in sources:
-                source_counter[source['source_name']] += 1
-
-    for source_name, count in source_counter.most_common(20):
-        example_quote = ""
-        for source in all_sources:
-            if source['source_name'] == source_name:
-                example_quote = source['quote']
-                break
-
-        existing = db.query(AuthoritativeSource).filter_by(source_name=source_name).first()
+    db.close()
+    return report
+
+def save_authoritative_sources(db: Session, collector: SourceCollector):
+    """Обновляет топ-20 источников в таблице authoritative_sources"""
+    top_sources = collector.source_counter.most_common(20)
+    existing_sources = {
+        source.source_name: source
+        for source in db.query(AuthoritativeSource).filter(
+            AuthoritativeSource.source_name.in_([name for name, _ in top_sources])
+        )
+    }
+    new_sources = []
+
+    for source_name, count in top_sources:
+        example_quote = collector.example_quotes.get(source_name, "")
+        existing = existing_sources.get(source_name)
         
         if existing:
             existing.mention_count = count
             if example_quote and not existing.example_quote:
                 existing.example_quote = example_quote
         else:
-            source_record = AuthoritativeSource(
-                source_name=source_name,
-                mention_count=count,
-                example_quote=example_quote
-            )
-            db.add(source_record)
+            new_sources.append({
+                'source_name': source_name,
+                'mention_count': count,
+                'example_quote': example_quote
+            })
     
+    bulk_insert(db, AuthoritativeSource, new_sources)
     db.commit()
-    report = {
-        'total_sources_found': len(set([s['source_name'] for s in all_sources])),
-        'top_sources': [(name, count) for name, count in source_counter.most_common(10)],
-        'sources_by_type': {},
-        'blind_spots': find_blind_spots(db, source_counter)
-    }
 
-    for source in all_sources:
-        source_type = source['source_type']
-        if source_type not in report['sources_by_type']:
-            report['sources_by_type'][source_type] = []
-        report['sources_by_type'][source_type].append(source['source_name'])
-    
-    db.close()
-    return report
+def build_sources_report(collector: SourceCollector, total_responses: int, blind_spots: List[Dict]) -> Dict:
+    return {
+        'total_sources_found': len(collector.source_counter),
+        'total_responses': total_responses,
+        'top_sources': [(name, count) for name, count in collector.source_counter.most_common(10)],
+        'sources_by_type': {
+            source_type: sorted(names) for source_type, names in collector.names_by_type.items()
+        },
+        'blind_spots': blind_spots
+    }
 
-def save_blind_spots_to_db(blind_spots):
+def save_blind_spots_to_db(blind_spots, seen_at: Optional[datetime] = None) -> int:
+    """Сворачивает найденные пары (ответ, источник) в пробелы и обновляет хранилище"""
     db = SessionLocal()
-    for spot in blind_spots:
-        blind_spot = BlindSpot(
-            source_name=spot['source_name'],
-            source_type=spot['source_type'],
-            competitors=json.dumps(spot['competitors_mentioned']),
-            context=spot['context_en'][:500]
-        )
-        db.add(blind_spot)
+    try:
+        saved = blind_spot_store.upsert(db, blind_spot_store.aggregate(blind_spots), seen_at)
+        db.commit()
+        return saved
+    finally:
+        db.close()
+
+def blind_spot_competitors(db: Session, response_ids: List[int]) -> Dict[int, List[str]]:
+    """{id ответа: конкуренты} для пачки ответов, где есть конкуренты и нет целевого продукта"""
+    if not response_ids:
+        return {}
+    found = product_response_ids(db, [config.TARGET_PRODUCT] + config.COMPETITORS,
+                                 id_range=(min(response_ids), max(response_ids)))
+    competitors_by_response = {}
+    for response_id in response_ids:
+        if response_id in found[config.TARGET_PRODUCT]:
+            continue
+        competitors = [comp for comp in config.COMPETITORS if response_id in found[comp]]
+        if competitors:
+            competitors_by_response[response_id] = competitors
+    return competitors_by_response
+
+def blind_spot_occurrences(response_id: int, competitors_mentioned: List[str], sources: List[Dict]) -> Iterator[Dict]:
+    for source in sources:
+        yield {
+            'response_id': response_id,
+            'source_name': source['source_name'],
+            'source_type': source['source_type'],
+            'context_en': source['context'],
+            'competitors_mentioned': competitors_mentioned,
+            'example_quote_en': source['quote']
+        }
+
+def iter_blind_spot_occurrences(db: Session) -> Iterator[Dict]:
+    """Пары (ответ, источник) для ответов, где есть конкуренты и нет целевого продукта"""
+    # Ответы с конкурентами и без целевого продукта выбираются по полнотекстовому индексу
+    candidate_ids = matching_ids(config.COMPETITORS).except_(matching_ids([config.TARGET_PRODUCT]))
+    competitor_ids = product_response_ids(db, config.COMPETITORS, within=candidate_ids)
+
+    for response in iter_responses(db, LLMResponse.response_text, where=LLMResponse.id.in_(candidate_ids)):
+        competitors_mentioned = [comp for comp in config.COMPETITORS if response.id in competitor_ids[comp]]
+        yield from blind_spot_occurrences(response.id, competitors_mentioned, extract_cited_sources(response.response_text))
+
+def save_blind_spots(db: Session, gaps: List[Dict], seen_at: datetime) -> List[Dict]:
+    """Записывает пробелы прохода и возвращает их для отчета"""
+    blind_spot_store.upsert(db, gaps, seen_at)
     db.commit()
-    db.close()
+
+    blind_spots = blind_spot_store.get_blind_spots(db, seen_since=seen_at)
+    for spot in blind_spots:
+        spot['context_ru'] = f"Упоминаются {', '.join(spot['competitors_mentioned'][:3])}..."
+    return blind_spots
 
 def find_blind_spots(db: Session, source_counter: Counter) -> List[Dict]:
     """
     Находит "слепые пятна" - источники, где упоминаются конкуренты,
-    но не упоминается целевой продукт
+    но не упоминается целевой продукт. Возвращает пробелы, найденные этим проходом.
     """
-    blind_spots = []
-
-    competitor_patterns = '|'.join([re.escape(comp) for comp in config.COMPETITORS])
-    
-    responses_with_competitors = db.query(LLMResponse).filter(
-        LLMResponse.response_text.regexp_match(f'.*({competitor_patterns}).*')
-    ).all()
-    
-    for response in responses_with_competitors:
-        target_lower = config.TARGET_PRODUCT.lower()
-        response_lower = response.response_text.lower()
-        
-        if target_lower not in response_lower:
-            sources = extract_cited_sources(response.response_text)
-            competitors_mentioned = []
-            for comp in config.COMPETITORS:
-                if comp.lower() in response_lower:
-                    competitors_mentioned.append(comp)
-            
-            for source in sources:
-                blind_spots.append({
-                    'response_id': response.id,
-                    'source_name': source['source_name'],
-                    'source_type': source['source_type'],
-                    'context_en': source['context'],
-                    'context_ru': f"Упоминаются {', '.join(competitors_mentioned[:3])}...",
-                    'competitors_mentioned': competitors_mentioned,
-                    'example_quote_en': source['quote']
-                })
-    
-    save_blind_spots_to_db(blind_spots)
-    return blind_spots
+    seen_at = datetime.utcnow()
+    return save_blind_spots(db, blind_spot_store.aggregate(iter_blind_spot_occurrences(db)), seen_at)
 
-def generate_sources_report():
+def generate_sources_report(report: Optional[Dict] = None):
     """
     Генерирует отчёт об авторитетных источниках
+    report - готовый результат общего прохода анализа; без него ответы анализируются заново
     """
-    report = analyze_all_responses()
+    report = report or analyze_all_responses()
     
     print("\n" + "="*60)
     print("ОТЧЁТ ОБ АВТОРИТЕТНЫХ ИСТОЧНИКАХ")
@@ -249,6 +414,7 @@ def generate_sources_report():
         for i, spot in enumerate(report['blind_spots'][:5], 1):
             print(f"\n   {i}. Источник: {spot['source_name']}")
             print(f"      Тип источника: {spot['source_type']}")
+            print(f"      Ответов: {spot['occurrences']}, впервые: {spot['first_seen']:%Y-%m-%d}")
             competitors = spot['competitors_mentioned'][:3]
             if len(competitors) > 0:
                 print(f"      Упоминаются конкуренты: {', '.join(competitors)}")
@@ -266,7 +432,7 @@ def generate_sources_report():
     }
     
     with open('sources_report.json', 'w', encoding='utf-8') as f:
-        json.dump(report_with_metadata, f, ensure_ascii=False, indent=2)
+        json.dump(report_with_metadata, f, ensure_ascii=False, indent=2, default=str)
     
     print(f"\nОтчёт сохранён в файл: sources_report.json")
     print("="*60)
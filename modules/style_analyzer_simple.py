@@ -11,8 +11,13 @@ import re
 from typing import List, Dict
 from collections import Counter
 from database import SessionLocal, AuthoritativeSource
+from modules import page_store
+from modules.page_store import source_to_url
 import config
 
+# Characters of a stored full page used for style analysis
+MAX_PAGE_CHARS = 20000
+
 class SimpleStyleAnalyzer:
     def __init__(self):
         print("🧠 Initializing English style analyzer...")
@@ -275,11 +280,19 @@ class SimpleStyleAnalyzer:
         
         print(f"\n🎨 Analyzing style of {len(top_sources)} English sources...")
         
+        source_urls = {source.id: source_to_url(source.source_name) for source in top_sources}
+        page_texts = {
+            url: text for url, _, _, text in page_store.iter_latest_pages(db, [url for url in source_urls.values() if url])
+        }
+        
         source_styles = []
         
         for source in top_sources:
             example_texts = []
-            if source.example_quote and self.is_english_text(source.example_quote):
+            page_text = page_texts.get(source_urls[source.id])
+            if page_text and self.is_english_text(page_text[:MAX_PAGE_CHARS]):
+                example_texts.append(page_text[:MAX_PAGE_CHARS])
+            elif source.example_quote and self.is_english_text(source.example_quote):
                 example_texts.append(source.example_quote)
 
             if example_texts:
@@ -0,0 +1,83 @@
+# modules/text_search.py
+"""
+Поиск по текстам ответов LLM через полнотекстовый индекс llm_responses_fts
+Термины ищутся как фразы из целых слов без учета регистра ("Power Automate", "n8n").
+Если SQLite собран без FTS5, используется поиск подстроки по всей таблице.
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import column, func, or_, select, table, text
+from database import FTS_AVAILABLE, FTS_TABLE, LLMResponse
+
+fts = table(FTS_TABLE, column('rowid'), column(FTS_TABLE))
+
+def phrase(term: str) -> str:
+    """Термин как фраза FTS5: кавычки экранируются, операторы внутри не действуют"""
+    return '"' + term.replace('"', '""') + '"'
+
+def match_any(terms: Iterable[str]) -> str:
+    return ' OR '.join(phrase(term) for term in terms)
+
+def matching_ids(terms: Iterable[str]):
+    """Подзапрос id ответов, где встречается хотя бы один из терминов - для LLMResponse.id.in_()"""
+    terms = [term for term in terms if term.strip()]
+    if FTS_AVAILABLE:
+        return select(fts.c.rowid).where(fts.c[FTS_TABLE].op('MATCH')(match_any(terms)))
+
+    response_lower = func.lower(LLMResponse.response_text)
+    return select(LLMResponse.id).where(or_(*(func.instr(response_lower, term.lower()) > 0 for term in terms)))
+
+def product_response_ids(db, products: Iterable[str], within=None,
+                         id_range: Optional[Tuple[int, int]] = None) -> Dict[str, Set[int]]:
+    """
+    {продукт: id ответов с ним}; within - подзапрос или список id, которым ограничивается поиск,
+    id_range - диапазон id (FTS5 сразу переходит к нему, не перебирая весь список совпадений)
+    """
+    found = {}
+    for product in products:
+        query = matching_ids([product])
+        id_column = query.selected_columns[0]
+        if within is not None:
+            query = query.where(id_column.in_(within))
+        if id_range is not None:
+            query = query.where(id_column.between(*id_range))
+        found[product] = {response_id for response_id, in db.execute(query)}
+    return found
+
+def search_responses(db, query: str, limit: int = 20) -> List[Dict]:
+    """
+    Поиск по произвольному запросу: ответы, содержащие все слова запроса, лучшие по bm25 первыми.
+    Возвращает id, дату и фрагмент текста с найденными словами в [скобках].
+    """
+    words = query.split()
+    if not words:
+        return []
+
+    if FTS_AVAILABLE:
+        rows = db.execute(text(
+            f"SELECT r.id, r.created_at, snippet({FTS_TABLE}, 0, '[', ']', '...', 16) "
+            f"FROM {FTS_TABLE} JOIN llm_responses r ON r.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :query ORDER BY bm25({FTS_TABLE}) LIMIT :limit"
+        ), {'query': ' '.join(phrase(word) for word in words), 'limit': limit})
+        return [{'id': response_id, 'created_at': created_at, 'snippet': snippet}
+                for response_id, created_at, snippet in rows]
+
+    response_lower = func.lower(LLMResponse.response_text)
+    rows = db.query(LLMResponse.id, LLMResponse.created_at, LLMResponse.response_text).filter(
+        *(func.instr(response_lower, word.lower()) > 0 for word in words)
+    ).order_by(LLMResponse.created_at.desc()).limit(limit)
+
+    results = []
+    for response_id, created_at, response_text in rows:
+        position = response_text.lower().find(words[0].lower())
+        results.append({
+            'id': response_id,
+            'created_at': created_at,
+            'snippet': response_text[max(0, position - 60):position + 60]
+        })
+    return results
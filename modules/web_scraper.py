@@ -8,19 +8,24 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
+import asyncio
 import requests
 import json
 import time
 from typing import Dict, Optional
-from bs4 import BeautifulSoup
 from database import SessionLocal, AuthoritativeSource
+from modules.fetcher import AsyncFetcher
+from modules import http_cache
+from modules import html_extract
+from modules import page_store
+from modules.page_store import source_to_url
 import config
 
 class WebScraper:
     def __init__(self):
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            'User-Agent': config.SCRAPER_USER_AGENT
         })
     
     def scrape_website(self, url: str) -> Optional[Dict]:
@@ -30,58 +35,21 @@ class WebScraper:
         try:
             print(f"Собираю данные с: {url}")
             
-            response = self.session.get(url, timeout=15)
+            cached = http_cache.get_entry(url)
+            response = self.session.get(url, timeout=config.SCRAPER_TIMEOUT,
+                                        headers=http_cache.conditional_headers(cached))
+            
+            if response.status_code == 304 and cached:
+                return self.reuse_cached(url, cached)
+            
             response.raise_for_status()
             
             if response.encoding is None:
                 response.encoding = 'utf-8'
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            title = soup.title.string if soup.title else ""
-
-            for script in soup(["script", "style", "nav", "footer", "header", "aside"]):
-                script.decompose()
-
-            main_content = soup.find('main') or soup.find('article') or soup.find('div', {'class': 'content'}) or soup
-
-            text = main_content.get_text(separator=' ', strip=True)
-            
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            
-            # Извлекаем мета-описание
-            meta_desc = soup.find("meta", {"name": "description"}) or soup.find("meta", {"property": "og:description"})
-            description = meta_desc["content"] if meta_desc else ""
-            
-            # Ищем упоминания продуктов (на английском)
-            mentions = {}
-            all_products = [config.TARGET_PRODUCT] + config.COMPETITORS
-            
-            text_lower = text.lower()
-            for product in all_products:
-                product_lower = product.lower()
-                if product_lower in text_lower:
-                    # Находим все упоминания
-                    import re
-                    pattern = re.compile(r'.{0,50}' + re.escape(product) + r'.{0,50}', re.IGNORECASE)
-                    matches = pattern.findall(text)
-                    mentions[product] = {
-                        'count': len(matches),
-                        'examples': matches[:3]  # Первые 3 упоминания
-                    }
-            
-            return {
-                'url': url,
-                'title': title[:200],
-                'description': description[:500],
-                'content_preview': text[:1000] + '...' if len(text) > 1000 else text,
-                'content_length': len(text),
-                'mentions': mentions,
-                'has_target_product': config.TARGET_PRODUCT.lower() in text_lower,
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-            }
+            data = self.parse_page(url, response.content)
+            http_cache.put(url, response.headers, data)
+            return data
             
         except requests.exceptions.Timeout:
             print(f"Таймаут при запросе к {url}")
@@ -93,15 +61,88 @@ class WebScraper:
             print(f"Ошибка при обработке {url}: {e}")
             return None
     
-    def scrape_known_sources(self) -> Dict:
+    def reuse_cached(self, url: str, cached: Dict) -> Dict:
+        """Результат для неизменившейся страницы (ответ 304)"""
+        http_cache.mark_not_modified(url)
+        data = cached['data']
+        if data.get('content_hash'):
+            self.store_page(url, data['title'], digest=data['content_hash'])
+        return dict(data, timestamp=time.strftime('%Y-%m-%d %H:%M:%S'))
+    
+    def store_page(self, url: str, title: str, text: Optional[str] = None,
+                   digest: Optional[str] = None) -> Optional[str]:
+        """
+        Сохраняет полный текст страницы в page_store (одинаковые тексты хранятся один раз)
+        и отмечает загрузку. Для неизменившейся страницы передается только digest.
+        """
+        db = SessionLocal()
+        try:
+            if text is not None:
+                digest = page_store.store_blob(db, text)
+            page_store.record_snapshot(db, url, digest, title)
+            db.commit()
+            return digest
+        except Exception as e:
+            print(f"Не удалось сохранить текст страницы {url}: {e}")
+            db.rollback()
+            return None
+        finally:
+            db.close()
+    
+    def parse_page(self, url: str, content: bytes) -> Dict:
+        """
+        Извлекает заголовок, описание, текст и упоминания продуктов из HTML
+        Парсер выбирается в html_extract (SCRAPER_HTML_BACKEND)
+        """
+        extracted = html_extract.get_backend()(content)
+        title = extracted['title']
+        description = extracted['description']
+        text = extracted['text']
+        
+        all_products = [config.TARGET_PRODUCT] + config.COMPETITORS
+        mentions = html_extract.get_product_matcher(tuple(all_products)).find(text)
+        
+        return {
+            'url': url,
+            'title': title[:200],
+            'description': description[:500],
+            'content_preview': text[:1000] + '...' if len(text) > 1000 else text,
+            'content_length': len(text),
+            'mentions': mentions,
+            'has_target_product': config.TARGET_PRODUCT in mentions,
+            'content_hash': self.store_page(url, title[:200], text),
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+    
+    def process_fetched(self, fetched: Dict, cached: Optional[Dict]) -> Optional[Dict]:
+        """Результат загрузки AsyncFetcher -> данные страницы (None, если страницу не удалось получить)"""
+        url = fetched['url']
+        if fetched['status'] == 304 and cached:
+            return self.reuse_cached(url, cached)
+        if fetched['error'] or fetched['status'] >= 300:
+            print(f"Пропускаю {url}: {fetched['error'] or 'HTTP ' + str(fetched['status'])} "
+                  f"(попыток: {fetched['attempts']})")
+            return None
+        
+        try:
+            data = self.parse_page(url, fetched['content'])
+        except Exception as e:
+            print(f"Ошибка при обработке {url}: {e}")
+            return None
+        http_cache.put(url, fetched['headers'], data)
+        return data
+    
+    def scrape_known_sources(self, limit: Optional[int] = None) -> Dict:
         """
         Собирает данные с известных платформ из базы данных
+        Страницы загружаются параллельно: общий лимит SCRAPER_MAX_CONCURRENCY,
+        не больше SCRAPER_PER_HOST_RATE запросов в минуту к одному хосту
         """
         db = SessionLocal()
 
         top_sources = db.query(AuthoritativeSource).order_by(
             AuthoritativeSource.mention_count.desc()
-        ).limit(8).all()
+        ).limit(limit or config.SCRAPER_SOURCES_LIMIT).all()
         
         results = {
             'websites': [],
@@ -112,40 +153,38 @@ class WebScraper:
             }
         }
         
-        print(f"\nНачинаю сбор данных с топ-{len(top_sources)} источников...")
+        urls = [url for url in (source_to_url(source.source_name) for source in top_sources) if url]
+        
+        print(f"\nНачинаю сбор данных с {len(urls)} источников...")
 
         scraped_count = 0
-        for source in top_sources:
-            source_name = source.source_name
-
-            if '.' not in source_name or ' ' in source_name:
-                continue
+        cached_entries = http_cache.get_entries(urls)
+        
+        async def handle_result(fetched: Dict):
+            nonlocal scraped_count
+            url = fetched['url']
+            # Разбор и запись в SQLite идут в отдельном потоке, чтобы не останавливать загрузки
+            data = await asyncio.to_thread(self.process_fetched, fetched, cached_entries.get(url))
+            if data is None:
+                return
 
-            url = source_name
-            if not url.startswith(('http://', 'https://')):
-                url = f'https://{url}'
-            
-            try:
-                print(f"\n[{scraped_count + 1}/{len(top_sources)}] Проверяю: {url}")
-                data = self.scrape_website(url)
-                
-                if data:
-                    results['websites'].append(data)
-                    scraped_count += 1
+            results['websites'].append(data)
+            scraped_count += 1
 
-                    if data['has_target_product']:
-                        results['summary']['target_mentions'] += 1
-                    competitor_count = sum(1 for product in config.COMPETITORS 
-                                         if product.lower() in data.get('mentions', {}))
-                    results['summary']['competitor_mentions'] += competitor_count
-                    target_status = "ЕСТЬ" if data['has_target_product'] else "НЕТ"
-                    print(f"   Статус упоминания {config.TARGET_PRODUCT}: {target_status}")
-                    print(f"   Длина контента: {data['content_length']} символов")
-                    print(f"   Английский контент: {data['english_ratio']:.1%}")
-                
-            except Exception as e:
-                print(f"Пропускаю из-за ошибки: {e}")
-            time.sleep(2)
+            if data['has_target_product']:
+                results['summary']['target_mentions'] += 1
+            competitor_count = sum(1 for product in config.COMPETITORS 
+                                 if product.lower() in data.get('mentions', {}))
+            results['summary']['competitor_mentions'] += competitor_count
+            target_status = "ЕСТЬ" if data['has_target_product'] else "НЕТ"
+            print(f"\n[{scraped_count}/{len(urls)}] {url} ({fetched['elapsed']:.1f} с)")
+            print(f"   Статус упоминания {config.TARGET_PRODUCT}: {target_status}")
+            print(f"   Длина контента: {data['content_length']} символов")
+        
+        asyncio.run(AsyncFetcher().fetch_all(
+            urls, handle_result, headers_for=lambda url: http_cache.conditional_headers(cached_entries.get(url))
+        ))
+        print(http_cache.format_stats())
         
         results['summary']['total_scraped'] = scraped_count
         db.close()
@@ -0,0 +1,171 @@
+# tests/test_fetcher.py
+"""
+Проверки AsyncFetcher на локальном HTTP-сервере: общий лимит одновременных запросов,
+лимит частоты на хост, повторы после 503 с Retry-After, таймауты, ответ 304 и цикл редиректов.
+
+Запуск: python -m pytest tests/test_fetcher.py
+"""
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import threading
+import time
+import unittest
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from modules.fetcher import AsyncFetcher
+
+ETAG = '"page-v1"'
+
+class FixtureState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.hits = defaultdict(int)
+        self.request_times = defaultdict(list)
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    /slow/*  - отвечает через 0.2 с, считает одновременные запросы
+    /flaky   - первый запрос 503 с Retry-After: 1, дальше 200
+    /hang    - отвечает через 3 с
+    /etag    - 304, если пришел If-None-Match с текущим ETag
+    /loop    - 302 на себя же (бесконечный редирект)
+    остальные пути - 200 сразу
+    """
+
+    def do_GET(self):
+        state = self.server.state
+        path = self.path
+        with state.lock:
+            state.hits[path] += 1
+            hit = state.hits[path]
+            state.request_times[self.headers.get('Host', '').split(':')[0]].append(time.monotonic())
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+
+        try:
+            if path.startswith('/slow/'):
+                time.sleep(0.2)
+                self.reply(200, b'slow')
+            elif path == '/flaky' and hit == 1:
+                self.reply(503, b'busy', {'Retry-After': '1'})
+            elif path == '/hang':
+                time.sleep(3)
+                self.reply(200, b'late')
+            elif path == '/loop':
+                self.reply(302, b'', {'Location': '/loop'})
+            elif path == '/etag' and self.headers.get('If-None-Match') == ETAG:
+                self.reply(304, b'', {'ETag': ETAG})
+            else:
+                self.reply(200, b'page', {'ETag': ETAG})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class AsyncFetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+        self.server.daemon_threads = True
+        self.server.state = FixtureState()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path, host='127.0.0.1'):
+        return f'http://{host}:{self.port}{path}'
+
+    def fetch_all(self, urls, headers_for=None, on_result=None, **kwargs):
+        kwargs.setdefault('per_host_rate', 60000)
+        kwargs.setdefault('retries', 0)
+        kwargs.setdefault('backoff_base', 0.01)
+        return asyncio.run(AsyncFetcher(**kwargs).fetch_all(urls, on_result, headers_for=headers_for))
+
+    def test_global_concurrency_cap(self):
+        results = self.fetch_all([self.url(f'/slow/{i}') for i in range(12)], max_concurrency=3)
+
+        self.assertEqual([result['status'] for result in results], [200] * 12)
+        self.assertLessEqual(self.server.state.max_in_flight, 3)
+        self.assertGreaterEqual(self.server.state.max_in_flight, 2)
+
+    def test_per_host_rate_limit(self):
+        # 600 запросов в минуту - не чаще одного запроса в 0.1 с к каждому хосту, хосты независимы
+        urls = [self.url(f'/page/{i}', host) for i in range(5) for host in ('127.0.0.1', 'localhost')]
+        started = time.monotonic()
+        results = self.fetch_all(urls, per_host_rate=600)
+
+        self.assertEqual(len(results), 10)
+        request_times = self.server.state.request_times
+        self.assertEqual(set(request_times), {'127.0.0.1', 'localhost'})
+        for times in request_times.values():
+            gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+            self.assertGreaterEqual(min(gaps), 0.08)
+        self.assertLess(abs(request_times['127.0.0.1'][0] - request_times['localhost'][0]), 0.08)
+        self.assertLess(time.monotonic() - started, 2.0)
+
+    def test_retry_after_on_503(self):
+        # backoff_base большой: успешный повтор примерно через секунду возможен только по Retry-After
+        result, = self.fetch_all([self.url('/flaky')], retries=2, backoff_base=10)
+
+        self.assertEqual(result['status'], 200)
+        self.assertEqual(result['attempts'], 2)
+        self.assertIsNone(result['error'])
+        self.assertGreaterEqual(result['elapsed'], 0.9)
+        self.assertLess(result['elapsed'], 5)
+
+    def test_timeout_on_hanging_endpoint(self):
+        result, = self.fetch_all([self.url('/hang')], timeout=0.3, retries=1)
+
+        self.assertEqual(result['error'], 'timeout')
+        self.assertEqual(result['attempts'], 2)
+        self.assertLess(result['elapsed'], 2.0)
+
+    def test_redirect_loop_does_not_stop_other_urls(self):
+        seen = []
+        results = self.fetch_all([self.url('/loop'), self.url('/page/1')], on_result=seen.append, retries=2)
+
+        self.assertEqual(len(seen), 2)
+        by_url = {result['url']: result for result in results}
+        loop = by_url[self.url('/loop')]
+        self.assertTrue(loop['error'].startswith('TooManyRedirects'))
+        self.assertEqual(loop['attempts'], 1)
+        self.assertEqual(by_url[self.url('/page/1')]['status'], 200)
+
+    def test_conditional_get_revalidation(self):
+        first, = self.fetch_all([self.url('/etag')])
+        self.assertEqual(first['status'], 200)
+        self.assertEqual(first['headers']['etag'], ETAG)
+
+        revalidated, = self.fetch_all([self.url('/etag')],
+                                      headers_for=lambda url: {'If-None-Match': first['headers']['etag']})
+        self.assertEqual(revalidated['status'], 304)
+        self.assertEqual(revalidated['content'], b'')
+        self.assertIsNone(revalidated['error'])
+        self.assertEqual(revalidated['attempts'], 1)
+
+if __name__ == "__main__":
+    unittest.main()